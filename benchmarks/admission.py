@@ -0,0 +1,127 @@
+"""
+Load test for admission control (src/services/admission.py).
+
+First measures the capacity of one running worker with a closed loop of concurrent clients, then offers an open
+loop of Poisson arrivals at multiples of that rate and reports, per priority class, how many requests were served
+or shed and the latency of the served ones. With admission control the p99 of critical and normal requests should
+stay bounded at 2x capacity while low priority searches are shed with 503.
+
+    uvicorn main:app --workers 1
+    python benchmarks/admission.py --token <access token> --contact-id 1 --email <email> --password <password> \
+        --multipliers 0.5 1 2
+
+Every request carries a random X-Forwarded-For, so the per-client rate limiter sees many clients instead of one.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def requests_for(args):
+    auth = {"Authorization": f"Bearer {args.token}"}
+    return [
+        # (priority, share of traffic, request)
+        ("critical", 0.05, lambda: ("POST", "/api/auth/login", {"data": {"username": args.email,
+                                                                          "password": args.password}})),
+        ("normal", 0.55, lambda: ("GET", f"/api/contacts/{args.contact_id}", {"headers": auth})),
+        ("normal", 0.10, lambda: ("GET", "/api/users/me/", {"headers": auth})),
+        ("low", 0.30, lambda: ("GET", "/api/contacts/find", {"headers": auth,
+                                                             "params": {"name": random.choice("aeiou")}})),
+    ]
+
+
+async def send(client, request, results, priority):
+    method, path, kwargs = request()
+    headers = dict(kwargs.pop("headers", {}))
+    headers["X-Forwarded-For"] = f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, headers=headers, **kwargs)
+        code = response.status_code
+    except httpx.HTTPError:
+        code = "error"
+    results[priority].append((code, time.perf_counter() - started))
+
+
+def pick(mix):
+    point = random.random() * sum(share for _, share, _ in mix)
+    for priority, share, request in mix:
+        point -= share
+        if point <= 0:
+            return priority, request
+    return mix[-1][0], mix[-1][2]
+
+
+async def calibrate(client, mix, args) -> float:
+    deadline = time.perf_counter() + args.calibrate
+    results = defaultdict(list)
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            priority, request = pick(mix)
+            await send(client, request, results, priority)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    served = sum(1 for samples in results.values() for code, _ in samples if code == 200)
+    return served / (time.perf_counter() - started)
+
+
+async def offer(client, mix, rate, duration):
+    results = defaultdict(list)
+    tasks = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        priority, request = pick(mix)
+        tasks.append(asyncio.create_task(send(client, request, results, priority)))
+        await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def report(multiplier, rate, results):
+    for priority in ("critical", "normal", "low"):
+        samples = results.get(priority, [])
+        served = sorted(latency * 1000 for code, latency in samples if code == 200)
+        shed = sum(1 for code, _ in samples if code == 503)
+        other = len(samples) - len(served) - shed
+        p50 = statistics.median(served) if served else float("nan")
+        p99 = served[max(0, int(len(served) * 0.99) - 1)] if served else float("nan")
+        print(f"{multiplier:>5.1f}x {rate:>8.1f} {priority:<9} {len(samples):>7} {len(served):>7} {shed:>7} "
+              f"{other:>6} {p50:>8.1f} {p99:>8.1f}")
+
+
+async def main(args):
+    mix = requests_for(args)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        capacity = args.capacity or await calibrate(client, mix, args)
+        print(f"capacity {capacity:.1f} req/s")
+        print(f"{'load':>6} {'req/s':>8} {'priority':<9} {'sent':>7} {'served':>7} {'shed':>7} {'other':>6} "
+              f"{'p50 ms':>8} {'p99 ms':>8}")
+        for multiplier in args.multipliers:
+            rate = capacity * multiplier
+            report(multiplier, rate, await offer(client, mix, rate, args.duration))
+            await asyncio.sleep(args.cooldown)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="access token of the test user")
+    parser.add_argument("--email", required=True, help="login of the test user")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--contact-id", type=int, required=True, help="a contact of the test user")
+    parser.add_argument("--capacity", type=float, help="skip calibration and use this many requests per second")
+    parser.add_argument("--concurrency", type=int, default=32, help="clients of the calibration run")
+    parser.add_argument("--calibrate", type=float, default=10, help="seconds of the calibration run")
+    parser.add_argument("--multipliers", type=float, nargs="+", default=[0.5, 1, 2])
+    parser.add_argument("--duration", type=float, default=20, help="seconds of every load step")
+    parser.add_argument("--cooldown", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,148 @@
+"""
+Requests per second through the middleware stack of main.py, with the old @app.middleware("http") timing function
+(Starlette's BaseHTTPMiddleware) and with the pure ASGI TimingMiddleware that replaced it.
+
+Both stacks wrap the same routes and the same deadline and admission middleware, and are driven in-process over
+ASGI, so the numbers compare the cost of the middleware rather than of a server or client. GET /api/contacts/ runs
+for real against an in-memory SQLite database; authentication and rate limiting are overridden.
+
+    python -m benchmarks.middleware_stack --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+
+from fastapi import FastAPI, Request
+from fastapi_limiter.depends import RateLimiter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import main
+from src.conf.config import settings
+from src.database.connect import get_db
+from src.database.lazy import LazySession
+from src.database.models import Base, Contact, User
+from src.services.admission import AdmissionMiddleware, admission_control
+from src.services.auth import auth_service
+from src.services.deadline import DeadlineMiddleware, parse_timeouts
+from src.services.timing import TimingMiddleware
+
+
+async def add_process_time_header(request: Request, call_next):
+    # the middleware main.py used before, verbatim
+    start_time = time.time()
+    response = await call_next(request)
+    process_time = time.time() - start_time
+    response.headers["X-Process-Time"] = str(process_time)
+    return response
+
+
+def build(old: bool) -> FastAPI:
+    app = FastAPI()
+    app.router.routes.extend(main.app.routes)
+    app.exception_handlers.update(main.app.exception_handlers)
+    app.add_middleware(DeadlineMiddleware, default=settings.request_timeout,
+                       routes=parse_timeouts(settings.request_timeouts))
+    app.add_middleware(AdmissionMiddleware, control=admission_control)
+    if old:
+        app.middleware("http")(add_process_time_header)
+    else:
+        app.add_middleware(TimingMiddleware)
+    return app
+
+
+def override_dependencies(contacts: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    with factory() as db:
+        user = User(email="bench@example.com", password="secret")
+        db.add(user)
+        db.flush()
+        db.add_all([Contact(name=f"name{i}", surname="surname", email=f"c{i}@example.com", phone_number="0930000000",
+                            date_of_birth=date(1990, 1, 1), description="benchmark", user_id=user.id)
+                    for i in range(contacts)])
+        db.commit()
+
+    def db_override():
+        db = LazySession(factory)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def no_limit():
+        return None
+
+    overrides = {get_db: db_override, auth_service.get_current_user: lambda: user}
+    for route in main.app.routes:
+        for dependency in getattr(route, "dependant", None) and route.dependant.dependencies or ():
+            if isinstance(dependency.call, RateLimiter):
+                overrides[dependency.call] = no_limit
+    main.app.dependency_overrides.update(overrides)
+
+
+async def request(app, path: str) -> int:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 50000), "server": ("testserver", 80)}
+    status = 0
+    requested = False
+    done = asyncio.Event()
+
+    async def receive():
+        # like a server: the request body once, then a disconnect after the response is complete
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif not message.get("more_body", False):
+            done.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+async def throughput(app, path: str, requests: int, concurrency: int) -> float:
+    statuses = await asyncio.gather(*(request(app, path) for _ in range(concurrency)))
+    assert set(statuses) == {200}, statuses
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await request(app, path)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def run(args):
+    override_dependencies(args.contacts)
+    stacks = {"BaseHTTPMiddleware": build(old=True), "pure ASGI": build(old=False)}
+    print(f"{args.requests} requests, concurrency {args.concurrency}, best of {args.rounds}")
+    print(f"{'path':<15} {'stack':<19} {'req/s':>9}")
+    for path in ("/", "/api/contacts/"):
+        for name, app in stacks.items():
+            best = max([await throughput(app, path, args.requests, args.concurrency) for _ in range(args.rounds)])
+            print(f"{path:<15} {name:<19} {best:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--contacts", type=int, default=5, help="contacts returned by /api/contacts/")
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+Microbenchmark of the Python-side cost of the hot repository queries: building the statement, computing its cache
+key and, on a cache miss, compiling it, measured with the queries built per call through db.query(...).filter(...)
+as before and with the prebuilt statements of src/repository.
+
+    python -m benchmarks.query_construction --iterations 20000
+
+The "execute" columns run each query against an in-memory SQLite database holding one user and a few contacts,
+once with the engine's compiled cache and once without it, so the database side stays small and constant and the
+difference between the rows is the per-request Python work.
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, create_engine
+from sqlalchemy.orm import Session
+
+from src.database.models import Base, Contact, ContactTombstone, User
+from src.repository import contacts as repository_contacts, users as repository_users
+
+SINCE = datetime(2000, 1, 1)
+TODAY = date(2023, 6, 1)
+
+
+def before(db, user):
+    """The queries of a request as they were built before, one Query per call."""
+    return {
+        "user_by_email": lambda: db.query(User).filter(User.email == user.email),
+        "contact_by_id": lambda: db.query(Contact).filter(and_(Contact.id == 1, Contact.user_id == user.id)),
+        "user_contacts": lambda: db.query(Contact).filter(Contact.user_id == user.id),
+        "changes": lambda: db.query(Contact).filter(Contact.user_id == user.id).filter(Contact.updated_at > SINCE),
+        "tombstones": lambda: db.query(ContactTombstone).filter(
+            (ContactTombstone.user_id == user.id) & (ContactTombstone.deleted_at > SINCE)),
+        "birthdays": lambda: db.query(Contact).filter(
+            (Contact.date_of_birth >= TODAY) & (Contact.date_of_birth <= TODAY + timedelta(days=7))
+            & (Contact.user_id == user.id)),
+    }
+
+
+def after(user):
+    """The same queries as prebuilt statements and their parameters."""
+    return {
+        "user_by_email": (repository_users.USER_BY_EMAIL, {"email": user.email}),
+        "contact_by_id": (repository_contacts.CONTACT_BY_ID, {"contact_id": 1, "user_id": user.id}),
+        "user_contacts": (repository_contacts.user_contacts(), {"user_id": user.id}),
+        "changes": (repository_contacts.user_contacts(changed=True), {"user_id": user.id, "since": SINCE}),
+        "tombstones": (repository_contacts.CHANGED_TOMBSTONES, {"user_id": user.id, "since": SINCE}),
+        "birthdays": (repository_contacts.UPCOMING_BIRTHDAYS,
+                      {"user_id": user.id, "first": TODAY, "last": TODAY + timedelta(days=7)}),
+    }
+
+
+def per_call(fn, iterations):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(args):
+    cached = create_engine("sqlite://")
+    uncached = create_engine("sqlite://", query_cache_size=0)
+    for engine in (cached, uncached):
+        Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            db.add(User(id=1, email="bench@example.com", password="secret"))
+            db.add_all([Contact(name=f"n{i}", surname="s", user_id=1, date_of_birth=TODAY) for i in range(5)])
+            db.commit()
+    user = User(id=1, email="bench@example.com")
+    dialect = cached.dialect
+
+    print(f"microseconds per call, {args.iterations} iterations")
+    print(f"{'query':<14} {'version':<7} {'build+key':>10} {'compile':>9} {'execute':>9} {'no cache':>9}")
+    totals = {"before": [0.0] * 4, "after": [0.0] * 4}
+    with Session(cached) as db, Session(uncached) as db_uncached:
+        old, new = before(db, user), after(user)
+        old_uncached = before(db_uncached, user)
+        for name in old:
+            stmt, params = new[name]
+            rows = {
+                "before": (
+                    per_call(lambda: old[name]().statement._generate_cache_key(), args.iterations),
+                    per_call(lambda: old[name]().statement.compile(dialect=dialect), args.iterations),
+                    per_call(lambda: old[name]().all(), args.iterations),
+                    per_call(lambda: old_uncached[name]().all(), args.iterations),
+                ),
+                "after": (
+                    per_call(lambda: stmt._generate_cache_key(), args.iterations),
+                    per_call(lambda: stmt.compile(dialect=dialect), args.iterations),
+                    per_call(lambda: db.scalars(stmt, params).all(), args.iterations),
+                    per_call(lambda: db_uncached.scalars(stmt, params).all(), args.iterations),
+                ),
+            }
+            for version, timings in rows.items():
+                totals[version] = [total + timing for total, timing in zip(totals[version], timings)]
+                print(f"{name:<14} {version:<7} " + " ".join(f"{timing:>9.1f}" for timing in timings))
+    for version, timings in totals.items():
+        print(f"{'all':<14} {version:<7} " + " ".join(f"{timing:>9.1f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    main(parser.parse_args())
@@ -0,0 +1,88 @@
+"""
+Load test for the contact change feed (GET /api/contacts/stream).
+
+Opens idle SSE subscribers against one running worker in steps, and at every step publishes events on the user's
+Redis channel and measures how long each subscriber takes to receive them (publish -> frame parsed by the client).
+
+    uvicorn main:app --workers 1
+    python benchmarks/sse_fanout.py --token <access token> --user-id 1 --server-pid <uvicorn pid> \
+        --steps 100 500 1000 2000 --events 20
+
+Raise the open file limit (ulimit -n) on both sides before going above ~1000 connections.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+import httpx
+import redis.asyncio as redis
+
+
+def rss_mb(pid: int | None) -> float | None:
+    if pid is None:
+        return None
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+async def subscriber(client: httpx.AsyncClient, token: str, ready: asyncio.Event, latencies: list[float]):
+    async with client.stream("GET", "/api/contacts/stream", headers={"Authorization": f"Bearer {token}"}) as response:
+        response.raise_for_status()
+        ready.set()
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                event = json.loads(line[len("data: "):])
+                if "ts" in event:
+                    latencies.append(time.time() - event["ts"])
+
+
+async def main(args):
+    r = redis.Redis(host=args.redis_host, port=args.redis_port, decode_responses=True)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(None, connect=30)
+    tasks = []
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        print(f"{'subscribers':>11} {'rss MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'received':>10}")
+        for target in args.steps:
+            while len(tasks) < target:
+                ready, latencies = asyncio.Event(), []
+                tasks.append((asyncio.create_task(subscriber(client, args.token, ready, latencies)), latencies))
+                await ready.wait()
+            for _, task_latencies in tasks:
+                task_latencies.clear()
+            await asyncio.sleep(args.settle)
+
+            for contact_id in range(args.events):
+                payload = json.dumps({"event": "updated", "contact_id": contact_id, "ts": time.time()})
+                await r.publish(f"contacts:{args.user_id}", payload)
+                await asyncio.sleep(args.interval)
+            await asyncio.sleep(args.settle)
+
+            samples = sorted(ms * 1000 for _, task_latencies in tasks for ms in task_latencies)
+            if samples:
+                p99 = samples[int(len(samples) * 0.99) - 1] if len(samples) > 1 else samples[0]
+                print(f"{len(tasks):>11} {rss_mb(args.server_pid) or 0:>8.1f} {statistics.median(samples):>8.2f} "
+                      f"{p99:>8.2f} {samples[-1]:>8.2f} {len(samples):>6}/{len(tasks) * args.events}")
+        for task, _ in tasks:
+            task.cancel()
+    await r.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--server-pid", type=int)
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--steps", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--settle", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
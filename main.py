@@ -1,18 +1,30 @@
-import time
+import logging
 
-import redis.asyncio as redis
 import uvicorn
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
 
 from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
-from src.database.connect import get_db
-from src.routes import contacts, auth, users
-
+from src.database.connect import get_db, redis_client
+from src.routes import contacts, auth, users, well_known, batch, metrics, debug
+from src.conf.config import settings
+from src.services.admission import AdmissionMiddleware, admission_control
+from src.services.blocking import BlockingMiddleware, blocking_detector
+from src.services.cache import contacts_cache
+from src.services.deadline import DeadlineMiddleware, operational_error_handler, parse_timeouts
+from src.services.events import contact_events
+from src.services.logs import AccessLogMiddleware, log_pipeline
+from src.services.loop_monitor import loop_monitor
+from src.services.memory import MemoryMiddleware, memory_tracker
+from src.services.profiling import ProfilingMiddleware, profile_store
+from src.services.timing import TimingMiddleware
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -28,20 +40,38 @@ app = FastAPI()
 #     allow_headers=["*"],
 # )
 
-
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+# Pure ASGI middleware only; the one added last runs first.
+app.add_middleware(ProfilingMiddleware, store=profile_store)
+app.add_middleware(DeadlineMiddleware, default=settings.request_timeout,
+                   routes=parse_timeouts(settings.request_timeouts))
+# Requests turned away by admission control never start their deadline.
+app.add_middleware(AdmissionMiddleware, control=admission_control, retry_after=settings.admission_retry_after)
+app.add_middleware(TimingMiddleware)
+if settings.memory_route_peaks:
+    app.add_middleware(MemoryMiddleware, tracker=memory_tracker)
+if settings.loop_block_detector:
+    app.add_middleware(BlockingMiddleware, detector=blocking_detector)
+# Outermost, so every log written while serving a request carries its id.
+app.add_middleware(AccessLogMiddleware)
+app.add_exception_handler(OperationalError, operational_error_handler)
 
 
 @app.on_event("startup")
 async def startup():
-    r = await redis.Redis(host='localhost', port=6379, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    log_pipeline.start()
+    await FastAPILimiter.init(redis_client)
+    loop_monitor.start()
+    if settings.loop_block_detector:
+        blocking_detector.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await contact_events.close()
+    await contacts_cache.close()
+    await loop_monitor.close()
+    await blocking_detector.close()
+    log_pipeline.close()
 
 
 @app.get("/")
@@ -58,8 +88,8 @@ def healthchecker(db: Session = Depends(get_db)):
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("Database health check failed")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Error connecting to the database")
 
@@ -69,6 +99,10 @@ def healthchecker(db: Session = Depends(get_db)):
 app.include_router(auth.router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(batch.router, prefix='/api')
+app.include_router(metrics.router, prefix='/api')
+app.include_router(debug.router, prefix='/api')
+app.include_router(well_known.router)
 
 if __name__ == '__main__':
     uvicorn.run(app="main:app", reload=True)
@@ -0,0 +1,61 @@
+"""normalized contact keys
+
+Revision ID: 5b7e2a9d0c14
+Revises: 8c1d2f4e6a73
+Create Date: 2026-10-19 15:24:41.310586
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.normalize import normalize_email, normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2a9d0c14'
+down_revision: Union[str, None] = '8c1d2f4e6a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('phone_number', sa.String),
+                    sa.column('email', sa.String), sa.column('phone_e164', sa.String),
+                    sa.column('email_normalized', sa.String))
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('phone_e164', sa.String(length=16), nullable=True))
+    op.add_column('contacts', sa.Column('email_normalized', sa.String(), nullable=True))
+
+    # Backfill and index outside the migration transaction, so every batch commits on its own and neither the
+    # backfill nor the index builds keep the table locked for their whole duration.
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        update = contacts.update().where(contacts.c.id == sa.bindparam('contact_id')).values(
+            phone_e164=sa.bindparam('phone_e164'), email_normalized=sa.bindparam('email_normalized'))
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.select(contacts.c.id, contacts.c.phone_number, contacts.c.email)
+                .where(contacts.c.id > last_id).order_by(contacts.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            bind.execute(update, [{'contact_id': row.id, 'phone_e164': normalize_phone(row.phone_number),
+                                   'email_normalized': normalize_email(row.email)} for row in rows])
+            last_id = rows[-1].id
+
+        op.create_index('ix_contacts_user_id_phone_e164', 'contacts', ['user_id', 'phone_e164'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_contacts_user_id_email_normalized', 'contacts', ['user_id', 'email_normalized'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_email_normalized', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_phone_e164', table_name='contacts')
+    op.drop_column('contacts', 'email_normalized')
+    op.drop_column('contacts', 'phone_e164')
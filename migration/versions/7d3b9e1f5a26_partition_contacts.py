@@ -0,0 +1,117 @@
+"""partition contacts by user_id
+
+Revision ID: 7d3b9e1f5a26
+Revises: e2f4a6c8b031
+Create Date: 2026-10-19 17:12:05.628410
+
+Turns contacts into a table hash partitioned on user_id with PARTITIONS partitions (contacts_p0 ...), so every
+user's contacts live in one smaller table with its own indexes and vacuum cycle. PostgreSQL only.
+
+The rows are copied while the application keeps running: batches of BATCH_SIZE ids are copied and committed one
+by one, then contacts is locked against writes and the rows changed or deleted since the copy started are
+synced before the tables are swapped. The primary key becomes (id, user_id), as a partitioned table needs the
+partition key in every unique constraint; ids still come from contacts_id_seq and stay unique.
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3b9e1f5a26'
+down_revision: Union[str, None] = 'e2f4a6c8b031'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+BATCH_SIZE = 50000
+
+
+def contact_indexes(bind, table: str) -> list[tuple[str, str]]:
+    return bind.execute(sa.text(
+        "SELECT indexname, indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = :table AND indexname <> :pkey"
+    ), {'table': table, 'pkey': f'{table}_pkey'}).all()
+
+
+def retarget_index(definition: str, name: str, new_name: str, table: str) -> str:
+    definition = definition.replace(f"INDEX {name} ON ", f"INDEX {new_name} ON ", 1)
+    return re.sub(r" ON (ONLY )?(\S+\.)?contacts ", f" ON {table} ", definition, count=1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    orphans = bind.execute(sa.text("SELECT count(*) FROM contacts WHERE user_id IS NULL")).scalar()
+    if orphans:
+        raise RuntimeError(f"{orphans} contacts have no user_id; delete or assign them before partitioning")
+
+    op.execute("CREATE TABLE contacts_partitioned (LIKE contacts INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+               "PARTITION BY HASH (user_id)")
+    op.execute("ALTER TABLE contacts_partitioned ALTER COLUMN user_id SET NOT NULL")
+    op.execute("ALTER TABLE contacts_partitioned ADD CONSTRAINT contacts_partitioned_pkey PRIMARY KEY (id, user_id)")
+    op.create_foreign_key('contacts_partitioned_user_id_fkey', 'contacts_partitioned', 'users', ['user_id'], ['id'],
+                          ondelete='CASCADE')
+    for remainder in range(PARTITIONS):
+        op.execute(f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts_partitioned "
+                   f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})")
+    # Indexes are created on the empty table, so the copy maintains them instead of building them under the lock.
+    indexes = contact_indexes(bind, 'contacts')
+    for name, definition in indexes:
+        op.execute(retarget_index(definition, name, f"{name}_partitioned", 'contacts_partitioned'))
+
+    with op.get_context().autocommit_block():
+        # Lets the final sync find the rows changed during the copy without scanning contacts under the lock.
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS contacts_updated_at_sync ON contacts (updated_at)")
+        # Transactions that were already open may still commit changes dated before the copy started.
+        started = bind.execute(sa.text(
+            "SELECT coalesce(min(xact_start), now()) FROM pg_stat_activity WHERE datname = current_database()"
+        )).scalar()
+        last_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM contacts")).scalar()
+        for low in range(0, last_id, BATCH_SIZE):
+            bind.execute(sa.text("INSERT INTO contacts_partitioned SELECT * FROM contacts "
+                                 "WHERE id > :low AND id <= :high"), {'low': low, 'high': low + BATCH_SIZE})
+
+    op.execute("LOCK TABLE contacts IN EXCLUSIVE MODE")
+    bind.execute(sa.text("DELETE FROM contacts_partitioned p USING contact_tombstones t "
+                         "WHERE t.contact_id = p.id AND t.user_id = p.user_id AND t.deleted_at >= :started"),
+                 {'started': started})
+    bind.execute(sa.text("DELETE FROM contacts_partitioned p USING contacts c "
+                         "WHERE c.id = p.id AND c.user_id = p.user_id AND c.updated_at >= :started"),
+                 {'started': started})
+    bind.execute(sa.text("INSERT INTO contacts_partitioned SELECT * FROM contacts "
+                         "WHERE id > :last_id OR updated_at >= :started"), {'last_id': last_id, 'started': started})
+
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts_partitioned.id")
+    op.execute("DROP TABLE contacts")
+    op.execute("ALTER TABLE contacts_partitioned RENAME TO contacts")
+    op.execute("ALTER TABLE contacts RENAME CONSTRAINT contacts_partitioned_pkey TO contacts_pkey")
+    op.execute("ALTER TABLE contacts RENAME CONSTRAINT contacts_partitioned_user_id_fkey TO contacts_user_id_fkey")
+    for name, _ in indexes:
+        op.execute(f"ALTER INDEX {name}_partitioned RENAME TO {name}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    indexes = contact_indexes(bind, 'contacts')
+    op.execute("LOCK TABLE contacts IN EXCLUSIVE MODE")
+    op.execute("CREATE TABLE contacts_unpartitioned (LIKE contacts INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    op.execute("ALTER TABLE contacts_unpartitioned ALTER COLUMN user_id DROP NOT NULL")
+    op.execute("INSERT INTO contacts_unpartitioned SELECT * FROM contacts")
+    op.execute("ALTER TABLE contacts_unpartitioned ADD CONSTRAINT contacts_unpartitioned_pkey PRIMARY KEY (id)")
+    op.create_foreign_key('contacts_unpartitioned_user_id_fkey', 'contacts_unpartitioned', 'users', ['user_id'],
+                          ['id'], ondelete='CASCADE')
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts_unpartitioned.id")
+    op.execute("DROP TABLE contacts")
+    op.execute("ALTER TABLE contacts_unpartitioned RENAME TO contacts")
+    op.execute("ALTER TABLE contacts RENAME CONSTRAINT contacts_unpartitioned_pkey TO contacts_pkey")
+    op.execute("ALTER TABLE contacts RENAME CONSTRAINT contacts_unpartitioned_user_id_fkey TO contacts_user_id_fkey")
+    for name, definition in indexes:
+        op.execute(retarget_index(definition, name, name, 'contacts'))
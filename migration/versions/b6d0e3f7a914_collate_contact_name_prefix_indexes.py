@@ -0,0 +1,67 @@
+"""collate contact name prefix indexes
+
+Revision ID: b6d0e3f7a914
+Revises: 7d3b9e1f5a26
+Create Date: 2026-10-19 18:41:27.305917
+
+Rebuilds the name and surname prefix indexes on lower(column) COLLATE "C" with the default operator class.
+A text_pattern_ops index answers LIKE 'prefix%' but cannot return rows in ORDER BY order, so suggest_contacts
+sorted every match; under the "C" collation the default operator class serves both. PostgreSQL only.
+
+The new indexes are built next to the old ones, partition by partition with CREATE INDEX CONCURRENTLY, and
+replace them once they are complete, so contacts stays writable and searchable throughout.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d0e3f7a914'
+down_revision: Union[str, None] = '7d3b9e1f5a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREFIX_INDEXES = {'ix_contacts_user_id_name_prefix': 'name', 'ix_contacts_user_id_surname_prefix': 'surname'}
+
+
+def contact_partitions(bind) -> list[str]:
+    return bind.execute(sa.text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'contacts'::regclass ORDER BY 1"
+    )).scalars().all()
+
+
+def rebuild_prefix_indexes(key: str) -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    partitions = contact_partitions(bind)
+    for name, column in PREFIX_INDEXES.items():
+        expression = key.format(column=column)
+        if partitions:
+            # An index ON ONLY the parent stays invalid until an index of every partition is attached to it.
+            op.execute(f"CREATE INDEX {name}_new ON ONLY contacts (user_id, {expression})")
+            with op.get_context().autocommit_block():
+                for partition in partitions:
+                    op.execute(f"CREATE INDEX CONCURRENTLY {partition}_{column}_prefix_new "
+                               f"ON {partition} (user_id, {expression})")
+            for partition in partitions:
+                op.execute(f"ALTER INDEX {name}_new ATTACH PARTITION {partition}_{column}_prefix_new")
+        else:
+            with op.get_context().autocommit_block():
+                op.execute(f"CREATE INDEX CONCURRENTLY {name}_new ON contacts (user_id, {expression})")
+
+        op.execute(f"DROP INDEX {name}")
+        op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+        for partition in partitions:
+            op.execute(f"ALTER INDEX {partition}_{column}_prefix_new RENAME TO {partition}_{column}_prefix")
+
+
+def upgrade() -> None:
+    rebuild_prefix_indexes('lower({column}) COLLATE "C"')
+
+
+def downgrade() -> None:
+    rebuild_prefix_indexes('lower({column}) text_pattern_ops')
@@ -0,0 +1,34 @@
+"""contact name prefix indexes
+
+Revision ID: e2f4a6c8b031
+Revises: 5b7e2a9d0c14
+Create Date: 2026-10-19 16:08:52.774103
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f4a6c8b031'
+down_revision: Union[str, None] = '5b7e2a9d0c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # text_pattern_ops lets LIKE 'prefix%' use the index whatever the database collation is.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_contacts_user_id_name_prefix', 'contacts',
+                        ['user_id', sa.text('lower(name) text_pattern_ops')], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_contacts_user_id_surname_prefix', 'contacts',
+                        ['user_id', sa.text('lower(surname) text_pattern_ops')], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_surname_prefix', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_name_prefix', table_name='contacts')
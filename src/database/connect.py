@@ -1,24 +1,100 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
+
+import redis.asyncio as redis
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.orm import Session, sessionmaker
 
 from src.conf.config import settings
+from src.database.lazy import LazySession
+from src.database.routing import ReplicaSet, RoutingSession
+from src.services.deadline import set_statement_timeout
+from src.services.logs import after_cursor_execute, before_cursor_execute
 
 # SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 # engine = create_engine(
 #     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 # )
 
+
+def engine_options(url: str) -> dict:
+    """
+    The engine_options function returns the driver specific arguments of create_engine for the given URL.
+        psycopg (3) prepares a statement on the server once it has run prepare_threshold times on a connection,
+        which pays off for the prebuilt repository queries. asyncpg prepares and caches statements by default,
+        and psycopg2 cannot prepare them, so neither needs anything.
+
+    :param url: str: The database URL
+    :return: Keyword arguments for create_engine
+    :doc-author: Trelent
+    """
+    if make_url(url).get_driver_name() == "psycopg":
+        return {"connect_args": {"prepare_threshold": settings.sqlalchemy_prepare_threshold}}
+    return {}
+
+
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=settings.sqlalchemy_pool_size,
+                       max_overflow=settings.sqlalchemy_max_overflow, **engine_options(SQLALCHEMY_DATABASE_URL))
+# Comma-separated URLs of read replicas; without them every query goes to engine.
+replica_engines = [create_engine(url.strip(), pool_pre_ping=True, **engine_options(url.strip()))
+                   for url in settings.sqlalchemy_replica_urls.split(",") if url.strip()]
+for bound in [engine, *replica_engines]:
+    event.listen(bound, "begin", set_statement_timeout)
+    event.listen(bound, "before_cursor_execute", before_cursor_execute)
+    event.listen(bound, "after_cursor_execute", after_cursor_execute)
+replica_set = ReplicaSet(engine, replica_engines, settings.replica_sticky_seconds, settings.replica_eject_seconds)
+
+# Without expiring on commit, objects loaded by a repository call stay readable after their connection went back
+# to the pool, so serializing the response does not check out another one to reload them.
+SessionLocal = sessionmaker(class_=RoutingSession, replica_set=replica_set, autocommit=False, autoflush=False,
+                            expire_on_commit=False, bind=engine)
+
+redis_client = redis.Redis(host=settings.redis_host, port=settings.redis, db=0, encoding="utf-8",
+                           decode_responses=True, socket_timeout=settings.redis_timeout,
+                           socket_connect_timeout=settings.redis_timeout)
+# Pub/sub waits on its connection for as long as nothing is published, so it must not have a read timeout.
+pubsub_client = redis.Redis(host=settings.redis_host, port=settings.redis, db=0, encoding="utf-8",
+                            decode_responses=True, socket_connect_timeout=settings.redis_timeout)
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def pool_occupancy() -> float:
+    """
+    The pool_occupancy function returns the share of the primary's connections that are checked out.
+        Checkouts only wait once it reaches 1, so it tells that requests are about to queue for connections
+        before they do.
+
+    :return: Checked out connections divided by pool_size + max_overflow
+    :doc-author: Trelent
+    """
+    return engine.pool.checkedout() / (settings.sqlalchemy_pool_size + settings.sqlalchemy_max_overflow)
 
 
 # Dependency
 def get_db():
-    db = SessionLocal()
+    db = LazySession(SessionLocal)
     try:
         yield db
     finally:
         db.close()
 
+
+async def get_redis():
+    return redis_client
+
+
+@contextmanager
+def nested_session(db: Session):
+    """
+    The nested_session function opens a second session on the connection and transaction of db.
+        Commits made through it only release a savepoint, so repository functions can be run unchanged
+        while the caller decides with db.commit() or db.rollback() whether all of their work is kept.
+
+    :param db: Session: The session that owns the transaction
+    :return: A session joined to the transaction of db
+    :doc-author: Trelent
+    """
+    nested = Session(bind=db.connection(), join_transaction_mode="create_savepoint", autoflush=False)
+    try:
+        yield nested
+    finally:
+        nested.close()
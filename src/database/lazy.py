@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LazySession:
+    """
+    A stand-in for the session of a request that creates the session on first use.
+
+    Requests that are rejected before they touch the database never create a session. The session itself checks out
+    a connection only for its first statement; what the proxy adds is giving it back early. Once the code that used
+    the session hands control back to the event loop (the first await that really waits, such as a Redis call or
+    sending the response), a transaction that has only read is committed, which returns its connection to the pool
+    instead of holding it until the request has finished. Transactions that flushed or executed changes, hold
+    unflushed ones, or whose connection was taken with connection() (see nested_session) are left to the caller to
+    commit or roll back. Results therefore have to be fetched before awaiting anything; with expire_on_commit=False
+    the loaded objects stay usable after the release.
+    """
+
+    def __init__(self, factory: Callable[[], Session]):
+        self._factory = factory
+        self._session: Session | None = None
+        self._wrote = False
+        self._release_scheduled = False
+
+    @property
+    def session(self) -> Session:
+        """
+        The session function returns the underlying session, creating it on the first call.
+
+        :param self: Represent the instance of the class
+        :return: The session of the request
+        :doc-author: Trelent
+        """
+        if self._session is None:
+            self._session = self._factory()
+            event.listen(self._session, "after_flush", self._on_flush)
+            event.listen(self._session, "do_orm_execute", self._on_execute)
+            event.listen(self._session, "after_transaction_end", self._on_transaction_end)
+            metrics.inc("db_sessions_created")
+        return self._session
+
+    def __getattr__(self, name):
+        session = self.session
+        if name == "connection":
+            self._wrote = True
+        self._schedule_release()
+        return getattr(session, name)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+    def _on_flush(self, session, flush_context) -> None:
+        self._wrote = True
+
+    def _on_execute(self, state) -> None:
+        if not state.is_select or state.statement._for_update_arg is not None:
+            self._wrote = True
+
+    def _on_transaction_end(self, session, transaction) -> None:
+        if transaction.parent is None:
+            self._wrote = False
+
+    def _schedule_release(self) -> None:
+        if self._release_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._release_scheduled = True
+        loop.call_soon(self._release)
+
+    def _release(self) -> None:
+        self._release_scheduled = False
+        session = self._session
+        if session is None or self._wrote or not session.in_transaction():
+            return
+        if session.new or session.dirty or session.deleted:
+            return
+        # called by the event loop: an exception here would only reach its exception handler and leave the
+        # session in a failed transaction, so it is logged and the connection is handed back explicitly
+        try:
+            session.commit()
+        except Exception:
+            logger.exception("Could not release the connection of a read-only session")
+            try:
+                session.rollback()
+            except Exception:
+                session.close()
+            return
+        metrics.inc("db_read_releases")
@@ -1,7 +1,9 @@
 from datetime import date
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Date, DateTime, func
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Date, DateTime, Index, func
+from sqlalchemy.orm import relationship, declarative_base, validates
+
+from src.services.normalize import normalize_email, normalize_phone
 
 Base = declarative_base()
 
@@ -36,9 +38,46 @@ class Contact(Base):
     phone_number = Column(String, index=True)
     date_of_birth = Column(Date)
     description = Column(String, index=True, nullable=True)
-    user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
+    # On PostgreSQL the table is hash partitioned on user_id, with (id, user_id) as primary key.
+    user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    phone_e164 = Column(String(16), nullable=True)
+    email_normalized = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
     user = relationship('User', backref="contacts")
 
+    __table_args__ = (
+        Index('ix_contacts_user_id_updated_at', 'user_id', 'updated_at'),
+        Index('ix_contacts_user_id_phone_e164', 'user_id', 'phone_e164'),
+        Index('ix_contacts_user_id_email_normalized', 'user_id', 'email_normalized'),
+        # Under the "C" collation one index serves both LIKE 'prefix%' and ORDER BY of suggest_contacts.
+        Index('ix_contacts_user_id_name_prefix', user_id, func.lower(name).collate('C')).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_user_id_surname_prefix', user_id,
+              func.lower(surname).collate('C')).ddl_if(dialect='postgresql'),
+    )
+
+    @validates('phone_number')
+    def validate_phone_number(self, key, phone_number):
+        self.phone_e164 = normalize_phone(phone_number)
+        return phone_number
+
+    @validates('email')
+    def validate_email(self, key, email):
+        self.email_normalized = normalize_email(email)
+        return email
+
+
+class ContactTombstone(Base):
+    __tablename__ = "contact_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    deleted_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_contact_tombstones_user_id_deleted_at', 'user_id', 'deleted_at'),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -48,6 +87,5 @@ class User(Base):
     password = Column(String(255), nullable=False)
     created_at = Column('created_at', DateTime, default=func.now())
     avatar = Column(String(255), nullable=True)
-    refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
 
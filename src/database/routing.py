@@ -0,0 +1,108 @@
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import Engine, Select, event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Who the current request acts for (the email of the user), used for read-your-writes stickiness.
+session_user: ContextVar[str | None] = ContextVar("session_user", default=None)
+
+
+class ReplicaSet:
+    """
+    A primary engine and its read replicas.
+
+    Replicas are used round-robin. A replica that fails with a connection error is ejected for eject_for seconds,
+    and when no replica is healthy reads go to the primary. After a user's write is committed, that user's reads go
+    to the primary for sticky_for seconds, which should cover the replication lag. Both are tracked per worker.
+    """
+
+    def __init__(self, primary: Engine, replicas: list[Engine], sticky_for: float, eject_for: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky_for = sticky_for
+        self.eject_for = eject_for
+        self._lock = threading.Lock()
+        self._next = itertools.cycle(replicas)
+        self._ejected: dict[Engine, float] = {}
+        self._sticky: dict[str, float] = {}
+        for replica in replicas:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def replica(self) -> Engine:
+        """
+        The replica function returns the next healthy replica, or the primary if there is none.
+
+        :param self: Represent the instance of the class
+        :return: The engine to read from
+        :doc-author: Trelent
+        """
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._next)
+                if self._ejected.get(replica, 0) <= now:
+                    self._ejected.pop(replica, None)
+                    return replica
+        return self.primary
+
+    def eject(self, replica: Engine) -> None:
+        with self._lock:
+            self._ejected[replica] = time.monotonic() + self.eject_for
+        logger.warning("Ejected read replica %s for %ss", replica.url.render_as_string(), self.eject_for)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or context.connection is None:
+            self.eject(context.engine)
+
+    def mark_write(self, user: str | None) -> None:
+        if user is None or not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._sticky[user] = now + self.sticky_for
+            if len(self._sticky) > 10000:
+                self._sticky = {key: until for key, until in self._sticky.items() if until > now}
+
+    def is_sticky(self, user: str | None) -> bool:
+        return user is not None and self._sticky.get(user, 0) > time.monotonic()
+
+
+class RoutingSession(Session):
+    """
+    A session that reads from a replica and writes to the primary.
+
+    Plain SELECTs go to one replica per session, unless the request's user has written recently. Everything else
+    (flushes, DML, SELECT ... FOR UPDATE, explicit connections) goes to the primary, and once a session has used the
+    primary it stays there, so it always sees its own writes.
+    """
+
+    def __init__(self, replica_set: ReplicaSet | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.replica_set = replica_set
+        self._replica: Engine | None = None
+        self._on_primary = False
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica_set is None or not self.replica_set.replicas:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self._flushing or not isinstance(clause, Select) or clause._for_update_arg is not None:
+            self._on_primary = self._wrote = True
+        elif self.replica_set.is_sticky(session_user.get()):
+            self._on_primary = True
+        if self._on_primary:
+            return self.replica_set.primary
+        if self._replica is None:
+            self._replica = self.replica_set.replica()
+        return self._replica
+
+    def commit(self) -> None:
+        super().commit()
+        if self._wrote and self.replica_set is not None:
+            self.replica_set.mark_write(session_user.get())
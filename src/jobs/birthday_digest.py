@@ -0,0 +1,115 @@
+"""
+Daily job that precomputes GET /api/contacts/upcoming_birthdays for every user.
+
+Run it once a day, shortly after midnight in the server's time zone, e.g. from cron:
+
+    birthday-digest                      # or: python -m src.jobs.birthday_digest
+    birthday-digest --send-reminders     # also email every user with upcoming birthdays
+    birthday-digest --date 2024-01-02    # build the digest of another day ahead of time
+"""
+import argparse
+import asyncio
+import json
+import logging
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from src.database.connect import SessionLocal, redis_client
+from src.repository import contacts as repository_contacts
+from src.schema import ResponseContact
+from src.services.birthdays import birthday_digest
+from src.services.email import send_birthday_reminder
+from src.services.logs import mask_email
+
+logger = logging.getLogger(__name__)
+
+
+async def send_reminders(reminders: list[tuple[str, str, list[dict]]], concurrency: int) -> int:
+    """
+    The send_reminders function emails a batch of users their upcoming birthdays, a few at a time.
+
+    :param reminders: list[tuple[str, str, list[dict]]]: The email, username and contacts of every user
+    :param concurrency: int: The number of emails sent at once
+    :return: The number of emails that could not be sent
+    :doc-author: Trelent
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(email, username, contacts):
+        async with semaphore:
+            await send_birthday_reminder(email, username, contacts)
+
+    results = await asyncio.gather(*(send(*reminder) for reminder in reminders), return_exceptions=True)
+    for (email, _, _), result in zip(reminders, results):
+        if isinstance(result, Exception):
+            logger.warning("Could not send birthday reminder to %s: %s", mask_email(email), result)
+    return sum(isinstance(result, Exception) for result in results)
+
+
+async def build_digest(day: date, db: Session, reminders: bool = False, batch_size: int = 1000,
+                       concurrency: int = 5) -> dict:
+    """
+    The build_digest function computes the upcoming birthdays of all users and publishes them for the day.
+
+    :param day: date: The day of the digest
+    :param db: Session: Pass in the database session to the function
+    :param reminders: bool: Email users who have upcoming birthdays
+    :param batch_size: int: The number of users written to Redis at a time
+    :param concurrency: int: The number of emails sent at once
+    :return: Counts of users, users with upcoming birthdays and failed emails
+    :doc-author: Trelent
+    """
+    stats = {"users": 0, "with_birthdays": 0, "failed_emails": 0}
+    batch, pending_reminders = {}, []
+
+    async def flush():
+        nonlocal batch, pending_reminders
+        await birthday_digest.add(day, batch)
+        if pending_reminders:
+            stats["failed_emails"] += await send_reminders(pending_reminders, concurrency)
+        batch, pending_reminders = {}, []
+
+    await birthday_digest.start(day)
+    async for user, contacts in repository_contacts.upcoming_birthdays_by_user(day, db, batch_size):
+        digest = [ResponseContact.model_validate(contact, from_attributes=True).model_dump(mode="json")
+                  for contact in contacts]
+        batch[user.id] = json.dumps(digest)
+        stats["users"] += 1
+        if digest:
+            stats["with_birthdays"] += 1
+            if reminders:
+                pending_reminders.append((user.email, user.username, digest))
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    if stats["users"]:
+        await birthday_digest.publish(day)
+    return stats
+
+
+async def run(args: argparse.Namespace) -> dict:
+    db = SessionLocal()
+    try:
+        return await build_digest(args.date, db, args.send_reminders, args.batch_size, args.mail_concurrency)
+    finally:
+        db.close()
+        await redis_client.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute upcoming birthdays of every user")
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(),
+                        help="day of the digest, YYYY-MM-DD (default: today)")
+    parser.add_argument("--send-reminders", action="store_true", help="email users who have upcoming birthdays")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--mail-concurrency", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stats = asyncio.run(run(args))
+    logger.info("Birthday digest for %s: %s", args.date, stats)
+
+
+if __name__ == "__main__":
+    main()
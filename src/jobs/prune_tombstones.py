@@ -0,0 +1,34 @@
+"""
+Daily job that deletes the tombstones of contacts deleted more than TOMBSTONE_RETENTION_DAYS ago.
+
+GET /api/contacts/changes answers cursors older than the retention with a full sync, so nothing a client still
+needs is lost. Run it once a day, e.g. from cron:
+
+    prune-tombstones                     # or: python -m src.jobs.prune_tombstones
+"""
+import argparse
+import asyncio
+import logging
+
+from src.database.connect import SessionLocal
+from src.repository import contacts as repository_contacts
+
+logger = logging.getLogger(__name__)
+
+
+async def run() -> int:
+    db = SessionLocal()
+    try:
+        return await repository_contacts.prune_tombstones(db)
+    finally:
+        db.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    argparse.ArgumentParser(description="Delete expired tombstones of deleted contacts").parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Pruned %s contact tombstones", asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
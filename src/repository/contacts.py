@@ -1,10 +1,59 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Select, bindparam, cast, delete, func, select
+from sqlalchemy.orm import Session, load_only
 
-from src.database.models import Contact, User
+from src.conf.config import settings
+from src.database.models import Contact, ContactTombstone, User
 from src.schema import ContactModel
+from src.services.birthdays import birthday_digest
+from src.services.cache import contacts_cache
+from src.services.events import publish_contact_event
+from src.services.normalize import normalize_email, normalize_phone
+
+
+# Key of session.info under which a caller collects the side effects of contact changes instead of running them.
+DEFERRED_CHANGES = "deferred_contact_changes"
+
+
+def defer_changes(db: Session) -> list[tuple[int, str, int]]:
+    """
+    The defer_changes function makes the contact changes made through db collect their side effects (cache and
+    birthday digest invalidation, SSE events) in the returned list instead of running them. Use it when the commit
+    of a repository function does not end the transaction (see nested_session), then pass the list to
+    publish_changes once the outer transaction has committed, or drop it on rollback.
+
+    :param db: Session: The session the changes are made through
+    :return: The list the changes are collected in
+    :doc-author: Trelent
+    """
+    return db.info.setdefault(DEFERRED_CHANGES, [])
+
+
+async def publish_changes(changes: list[tuple[int, str, int]]) -> None:
+    """
+    The publish_changes function invalidates the caches of the users whose contacts changed and publishes an event
+    per change. It must run after the changes were committed, or a concurrent read can cache the old rows again.
+
+    :param changes: list[tuple[int, str, int]]: The user id, event and contact id of every change
+    :return: None
+    :doc-author: Trelent
+    """
+    for user_id in dict.fromkeys(user_id for user_id, _, _ in changes):
+        await contacts_cache.invalidate(user_id)
+        await birthday_digest.invalidate(user_id)
+    for user_id, event, contact_id in changes:
+        await publish_contact_event(user_id, event, contact_id)
+
+
+async def _contact_changed(user_id: int, event: str, contact_id: int, db: Session) -> None:
+    deferred = db.info.get(DEFERRED_CHANGES)
+    if deferred is not None:
+        deferred.append((user_id, event, contact_id))
+    else:
+        await publish_changes([(user_id, event, contact_id)])
 
 
 async def create_contact(body: ContactModel, user: User, db: Session) -> Contact:
@@ -17,25 +66,70 @@ async def create_contact(body: ContactModel, user: User, db: Session) -> Contact
     :return: The created contact
     :doc-author: Trelent
     """
-    contact = Contact(**body.dict(), user=user)
+    contact = Contact(**body.dict(), user_id=user.id)
     db.add(contact)
     db.commit()
     db.refresh(contact)
+    await _contact_changed(user.id, "created", contact.id, db)
     return contact
 
 
-async def get_contacts(user: User, db: Session) -> Contact | None:
+# The hot queries are built once and run with parameters. Besides skipping the construction of the statement on every
+# call, a statement object memoizes its cache key, so finding its compiled SQL in the engine's cache is a dict lookup.
+CONTACT_BY_ID = select(Contact).where(Contact.id == bindparam("contact_id"), Contact.user_id == bindparam("user_id"))
+CONTACTS_BY_IDS = select(Contact).where(Contact.id.in_(bindparam("contact_ids", expanding=True)),
+                                        Contact.user_id == bindparam("user_id"))
+UPCOMING_BIRTHDAYS = select(Contact).where(Contact.user_id == bindparam("user_id"),
+                                           Contact.date_of_birth >= bindparam("first"),
+                                           Contact.date_of_birth <= bindparam("last"))
+# The database clock in the type updated_at and deleted_at are stored in.
+DATABASE_NOW = select(cast(func.now(), DateTime))
+CHANGED_TOMBSTONES = select(ContactTombstone).where(ContactTombstone.user_id == bindparam("user_id"),
+                                                    ContactTombstone.deleted_at > bindparam("since"))
+
+
+@lru_cache(maxsize=128)
+def user_contacts(fields: tuple[str, ...] | None = None, changed: bool = False) -> Select:
+    """
+    The user_contacts function returns the statement selecting the contacts of the user bound to user_id.
+        Every combination of arguments is built once and then reused.
+
+    :param fields: tuple[str, ...] | None: Load only these columns, or all of them if None
+    :param changed: bool: Select only the contacts updated after the moment bound to since
+    :return: A select statement
+    :doc-author: Trelent
+    """
+    stmt = select(Contact).where(Contact.user_id == bindparam("user_id"))
+    if changed:
+        stmt = stmt.where(Contact.updated_at > bindparam("since"))
+    if fields:
+        stmt = stmt.options(load_only(*(getattr(Contact, field) for field in fields)))
+    return stmt
+
+
+async def get_contacts(user: User, db: Session, fields: tuple[str, ...] | None = None) -> Contact | None:
     """
     The get_contacts function returns a list of contacts for the user with the given id.
 
 
     :param user: User: Get the user's id
     :param db: Session: Pass the database session to the function
+    :param fields: tuple[str, ...] | None: Load only these columns, or all of them if None
     :return: A list of contact objects, not a single object
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
-    return contacts
+    return db.scalars(user_contacts(fields), {"user_id": user.id}).all()
+
+
+def birthday_window(today: date):
+    """
+    The birthday_window function returns the filter for contacts with a birthday from today to 7 days ahead.
+
+    :param today: date: The first day of the window
+    :return: A SQLAlchemy filter expression
+    :doc-author: Trelent
+    """
+    return (Contact.date_of_birth >= today) & (Contact.date_of_birth <= today + timedelta(days=7))
 
 
 async def upcoming_birthdays(user: User, db: Session):
@@ -48,14 +142,31 @@ async def upcoming_birthdays(user: User, db: Session):
     :doc-author: Trelent
     """
     today = datetime.now().date()
-    end_date = today + timedelta(days=7)
-    contacts = db.query(Contact).filter(
-        (Contact.date_of_birth >= today) & (Contact.date_of_birth <= end_date) & (Contact.user_id == user.id)
-    ).all()
-    return contacts
+    return db.scalars(UPCOMING_BIRTHDAYS, {"user_id": user.id, "first": today,
+                                           "last": today + timedelta(days=7)}).all()
+
+
+async def upcoming_birthdays_by_user(today: date, db: Session, batch_size: int = 1000):
+    """
+    The upcoming_birthdays_by_user function yields the upcoming birthdays of every user from a single query.
+        Users are outer joined to their contacts in the window and the rows are streamed in batches,
+        so users without upcoming birthdays are yielded too, with an empty list.
+
+    :param today: date: The first day of the window
+    :param db: Session: Pass in the database session to the function
+    :param batch_size: int: The number of rows fetched at a time
+    :return: An async iterator of (user, contacts) pairs, where user is a row of id, username and email
+    :doc-author: Trelent
+    """
+    rows = db.query(User.id, User.username, User.email, Contact).outerjoin(
+        Contact, (Contact.user_id == User.id) & birthday_window(today)
+    ).order_by(User.id).yield_per(batch_size)
+    for _, group in groupby(rows, key=lambda row: row.id):
+        group = list(group)
+        yield group[0], [row.Contact for row in group if row.Contact is not None]
 
 
-async def read_contacts(user: User, db: Session, name, surname, email):
+async def read_contacts(user: User, db: Session, name, surname, email, fields: tuple[str, ...] | None = None):
     """
     The read_contacts function returns a list of contacts that match the given name, surname and email.
         If no parameters are provided, all contacts will be returned.
@@ -65,6 +176,7 @@ async def read_contacts(user: User, db: Session, name, surname, email):
     :param name: Filter the contacts by name
     :param surname: Filter the contacts by surname
     :param email: Filter the contacts by email
+    :param fields: tuple[str, ...] | None: Load only these columns, or all of them if None
     :return: A list of contacts
     :doc-author: Trelent
     """
@@ -75,9 +187,123 @@ async def read_contacts(user: User, db: Session, name, surname, email):
         contacts = contacts.filter(Contact.surname.ilike(f"%{surname}%") & (Contact.user_id == user.id))
     if email:
         contacts = contacts.filter(Contact.email.ilike(f"%{email}%") & (Contact.user_id == user.id))
+    if fields:
+        contacts = contacts.options(load_only(*(getattr(Contact, field) for field in fields)))
+    return contacts.all()
+
+
+async def lookup_contacts(user: User, db: Session, phone: str | None = None, email: str | None = None) -> list[Contact]:
+    """
+    The lookup_contacts function returns the contacts whose phone and email equal the given ones once normalized.
+        It is an exact match on the indexed normalized columns, so unlike read_contacts it does not scan.
+
+    :param user: User: Get the user's id from the database
+    :param db: Session: Pass the database session to the function
+    :param phone: str | None: The phone number in any format
+    :param email: str | None: The email address in any case
+    :return: A list of contacts, empty if a given value cannot be normalized
+    :doc-author: Trelent
+    """
+    contacts = db.query(Contact).filter(Contact.user_id == user.id)
+    if phone is not None:
+        phone_e164 = normalize_phone(phone)
+        if phone_e164 is None:
+            # comparing with None would become IS NULL and match every contact without a phone
+            return []
+        contacts = contacts.filter(Contact.phone_e164 == phone_e164)
+    if email is not None:
+        email_normalized = normalize_email(email)
+        if email_normalized is None:
+            return []
+        contacts = contacts.filter(Contact.email_normalized == email_normalized)
     return contacts.all()
 
 
+DUPLICATE_KEYS = ("phone_e164", "email_normalized")
+
+
+async def find_duplicates(user: User, db: Session) -> list[tuple[list[str], list[Contact]]]:
+    """
+    The find_duplicates function groups the user's contacts that share a normalized phone number or email.
+        For every key the database finds the values used more than once (GROUP BY ... HAVING) and joins the
+        contacts back to them, so no contacts are compared pairwise. Contacts linked through different keys
+        end up in one group.
+
+    :param user: User: Get the user's id from the database
+    :param db: Session: Pass the database session to the function
+    :return: A list of groups, each with the keys it was matched on and its contacts ordered by id
+    :doc-author: Trelent
+    """
+    parent: dict[int, int] = {}
+    contacts: dict[int, Contact] = {}
+    matched: dict[int, set[str]] = {}
+
+    def find(contact_id):
+        while parent[contact_id] != contact_id:
+            parent[contact_id] = parent[parent[contact_id]]
+            contact_id = parent[contact_id]
+        return contact_id
+
+    for key in DUPLICATE_KEYS:
+        column = getattr(Contact, key)
+        duplicated = db.query(column.label("value")).filter(
+            (Contact.user_id == user.id) & column.isnot(None)
+        ).group_by(column).having(func.count() > 1).subquery()
+        rows = db.query(Contact).join(duplicated, column == duplicated.c.value).filter(
+            Contact.user_id == user.id
+        ).order_by(column, Contact.id).all()
+        for _, group in groupby(rows, key=lambda contact: getattr(contact, key)):
+            group = list(group)
+            for contact in group:
+                contacts[contact.id] = contact
+                parent.setdefault(contact.id, contact.id)
+            root = find(group[0].id)
+            for contact in group[1:]:
+                parent[find(contact.id)] = root
+            matched.setdefault(root, set()).add(key)
+
+    groups: dict[int, list[Contact]] = {}
+    keys: dict[int, set[str]] = {}
+    for contact_id in sorted(contacts):
+        root = find(contact_id)
+        groups.setdefault(root, []).append(contacts[contact_id])
+    for root, group_keys in matched.items():
+        keys.setdefault(find(root), set()).update(group_keys)
+    return [(sorted(keys[root]), group) for root, group in groups.items()]
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def suggest_contacts(user: User, prefix: str, limit: int, db: Session) -> list[Contact]:
+    """
+    The suggest_contacts function returns the first contacts whose name or surname starts with prefix.
+        Name and surname are searched separately, each as a range scan of its (user_id, lower(column) COLLATE "C")
+        index limited to the requested number of rows, and the two lists are merged. The "C" collation compares
+        code points, so the index returns the rows already in order and Python merges them in the same order.
+
+    :param user: User: Get the user's id from the database
+    :param prefix: str: The beginning of the name or surname, in any case
+    :param limit: int: The maximum number of contacts returned
+    :param db: Session: Pass the database session to the function
+    :return: Up to limit contacts ordered by the matching name or surname
+    :doc-author: Trelent
+    """
+    pattern = escape_like(prefix.lower()) + "%"
+    matches = {}
+    for column in (Contact.name, Contact.surname):
+        key = func.lower(column).collate("C")
+        contacts = db.query(Contact).filter(
+            (Contact.user_id == user.id) & key.like(pattern, escape="\\")
+        ).options(load_only(Contact.id, Contact.name, Contact.surname)).order_by(key, Contact.id).limit(limit).all()
+        for contact in contacts:
+            match = getattr(contact, column.key).lower()
+            if contact.id not in matches or match < matches[contact.id][0]:
+                matches[contact.id] = (match, contact)
+    return [contact for _, contact in sorted(matches.values(), key=lambda item: (item[0], item[1].id))][:limit]
+
+
 async def get_contact(user: User, contact_id: int, db: Session):
     """
     The get_contact function returns a contact object from the database.
@@ -92,8 +318,64 @@ async def get_contact(user: User, contact_id: int, db: Session):
     :return: The contact with the given id if it exists, otherwise none
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    return contact
+    return db.scalars(CONTACT_BY_ID, {"contact_id": contact_id, "user_id": user.id}).first()
+
+
+async def get_contacts_by_ids(user: User, contact_ids: list[int], db: Session) -> list[Contact]:
+    """
+    The get_contacts_by_ids function returns the user's contacts with the given ids in a single query.
+        Ids that do not exist or belong to another user are simply absent from the result.
+
+    :param user: User: Get the user's id
+    :param contact_ids: list[int]: The ids of the contacts to fetch
+    :param db: Session: Pass the database session to the function
+    :return: A list of the contacts found
+    :doc-author: Trelent
+    """
+    return db.scalars(CONTACTS_BY_IDS, {"contact_ids": contact_ids, "user_id": user.id}).all()
+
+
+async def get_changes(user: User, since: datetime | None, db: Session) \
+        -> tuple[list[Contact], list[ContactTombstone], datetime, bool]:
+    """
+    The get_changes function returns what changed in the user's contacts after the given cursor, and the next cursor.
+        Both lookups are range scans on the (user_id, timestamp) indexes.
+
+        updated_at and deleted_at are the start times of the writing transactions, so a transaction that is still
+        running can later commit rows older than anything returned now. The next cursor is therefore held
+        SYNC_CURSOR_LAG seconds behind the database clock: rows newer than that are returned again on the next call,
+        so clients have to apply changes idempotently. A cursor older than the tombstone retention, or none,
+        gets a full sync.
+
+    :param user: User: Get the user's id
+    :param since: datetime | None: The cursor of the previous sync, or None for a full sync
+    :param db: Session: Pass the database session to the function
+    :return: The changed contacts, the tombstones of the deleted ones, the next cursor and whether it is a full sync
+    :doc-author: Trelent
+    """
+    now = db.scalar(DATABASE_NOW)
+    horizon = now - timedelta(seconds=settings.sync_cursor_lag)
+    if since is None or since < now - timedelta(days=settings.tombstone_retention_days):
+        return db.scalars(user_contacts(), {"user_id": user.id}).all(), [], horizon, True
+    params = {"user_id": user.id, "since": since}
+    contacts = db.scalars(user_contacts(changed=True), params).all()
+    tombstones = db.scalars(CHANGED_TOMBSTONES, params).all()
+    return contacts, tombstones, max(since, horizon), False
+
+
+async def prune_tombstones(db: Session) -> int:
+    """
+    The prune_tombstones function deletes the tombstones older than TOMBSTONE_RETENTION_DAYS.
+        Clients whose cursor is older than that get a full sync from get_changes instead.
+
+    :param db: Session: Pass the database session to the function
+    :return: The number of tombstones deleted
+    :doc-author: Trelent
+    """
+    before = DATABASE_NOW.scalar_subquery() - timedelta(days=settings.tombstone_retention_days)
+    result = db.execute(delete(ContactTombstone).where(ContactTombstone.deleted_at < before))
+    db.commit()
+    return result.rowcount
 
 
 async def update_contact(body: ContactModel, contact_id: int, user: User, db: Session):
@@ -112,15 +394,16 @@ async def update_contact(body: ContactModel, contact_id: int, user: User, db: Se
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    contact = db.scalars(CONTACT_BY_ID, {"contact_id": contact_id, "user_id": user.id}).first()
     if contact:
-        contact.name = body.name,
-        contact.surname = body.surname,
-        contact.phone_number = body.phone_number,
-        contact.date_of_birth = body.date_of_birth,
-        contact.description = body.description,
+        contact.name = body.name
+        contact.surname = body.surname
+        contact.phone_number = body.phone_number
+        contact.date_of_birth = body.date_of_birth
+        contact.description = body.description
         contact.email = body.email
         db.commit()
+        await _contact_changed(user.id, "updated", contact_id, db)
     return contact
 
 
@@ -138,9 +421,11 @@ async def remove_contact(contact_id: int, user: User, db: Session):
     :return: The contact object if it exists, otherwise none
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    contact = db.scalars(CONTACT_BY_ID, {"contact_id": contact_id, "user_id": user.id}).first()
     if contact:
         db.delete(contact)
+        db.add(ContactTombstone(contact_id=contact.id, user_id=user.id))
         db.commit()
+        await _contact_changed(user.id, "deleted", contact_id, db)
     return contact
 
@@ -0,0 +1,118 @@
+from uuid import uuid4
+
+from redis.asyncio import Redis
+
+from src.conf.config import settings
+
+
+def _session_key(email: str, jti: str) -> str:
+    return f"refresh_token:{email}:{jti}"
+
+
+def _rotated_key(email: str, jti: str) -> str:
+    return f"refresh_token_rotated:{email}:{jti}"
+
+
+def _generation_key(email: str) -> str:
+    return f"refresh_token_gen:{email}"
+
+
+async def create_session(email: str, r: Redis) -> dict:
+    """
+    The create_session function registers a new refresh token session for the user.
+        Every session is a separate key that expires together with the refresh token, so a user can be logged in
+        from several devices at once. The returned claims must be encoded into the refresh token.
+
+    :param email: str: Identify the user the session belongs to
+    :param r: Redis: Pass the redis client to the function
+    :return: The jti and gen claims of the new session
+    :doc-author: Trelent
+    """
+    jti = uuid4().hex
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.get(_generation_key(email))
+        pipe.set(_session_key(email, jti), 1, ex=settings.refresh_token_ttl)
+        generation, _ = await pipe.execute()
+    return {"jti": jti, "gen": int(generation or 0)}
+
+
+async def is_session_active(payload: dict, r: Redis) -> bool:
+    """
+    The is_session_active function checks that the session of a decoded refresh token has been neither revoked
+    nor invalidated by revoke_all_sessions.
+
+    :param payload: dict: The claims of the refresh token
+    :param r: Redis: Pass the redis client to the function
+    :return: True if the refresh token may still be used
+    :doc-author: Trelent
+    """
+    email, jti = payload.get("sub"), payload.get("jti")
+    if email is None or jti is None:
+        return False
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.get(_generation_key(email))
+        pipe.exists(_session_key(email, jti))
+        generation, exists = await pipe.execute()
+    return bool(exists) and int(generation or 0) == payload.get("gen", 0)
+
+
+async def consume_session(payload: dict, r: Redis) -> bool:
+    """
+    The consume_session function revokes the session of a decoded refresh token so that it can be rotated.
+        The DEL of the session key is the check: of concurrent refreshes with the same token only the one
+        that deleted the key succeeds. The token is remembered as rotated for REFRESH_REUSE_GRACE seconds;
+        presenting it again within that window (two tabs refreshing at once) is merely refused, while presenting it
+        later, or a token whose session never existed, is treated as reuse of a stolen token
+        and revokes all sessions of the user.
+
+    :param payload: dict: The claims of the refresh token
+    :param r: Redis: Pass the redis client to the function
+    :return: True if the session was active and is now revoked, so a new one may be created
+    :doc-author: Trelent
+    """
+    email, jti = payload.get("sub"), payload.get("jti")
+    if email is None or jti is None:
+        return False
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.get(_generation_key(email))
+        pipe.delete(_session_key(email, jti))
+        pipe.exists(_rotated_key(email, jti))
+        pipe.set(_rotated_key(email, jti), 1, nx=True, ex=settings.refresh_reuse_grace)
+        generation, deleted, rotated, _ = await pipe.execute()
+    if int(generation or 0) != payload.get("gen", 0):
+        return False
+    if deleted:
+        return True
+    if not rotated:
+        await revoke_all_sessions(email, r)
+    return False
+
+
+async def revoke_session(payload: dict, r: Redis) -> None:
+    """
+    The revoke_session function revokes the single session of a decoded refresh token.
+        Tokens issued without a jti have no session of their own and are left alone.
+
+    :param payload: dict: The claims of the refresh token
+    :param r: Redis: Pass the redis client to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    email, jti = payload.get("sub"), payload.get("jti")
+    if email is None or jti is None:
+        return
+    await r.delete(_session_key(email, jti))
+
+
+async def revoke_all_sessions(email: str, r: Redis) -> None:
+    """
+    The revoke_all_sessions function revokes every refresh token of the user with a single INCR.
+        Tokens carry the generation they were issued in, so bumping it invalidates all of them at once;
+        the orphaned session keys simply expire.
+
+    :param email: str: Identify the user whose sessions are revoked
+    :param r: Redis: Pass the redis client to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    await r.incr(_generation_key(email))
@@ -1,8 +1,21 @@
-﻿from libgravatar import Gravatar
+﻿import logging
+
+from libgravatar import Gravatar
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from src.database.models import User
 from src.schema import UserModel
+from src.services.logs import mask_email
+
+logger = logging.getLogger(__name__)
+
+# Built once: looking up the user runs on every authenticated request.
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+CONFIRM_EMAIL = update(User).where(User.email == bindparam("confirm_email"), User.confirmed.isnot(True)) \
+    .values(confirmed=True) \
+    .returning(User.id)
 
 
 async def get_user_by_email(email: str, db: Session) -> User | None:
@@ -15,16 +28,18 @@ async def get_user_by_email(email: str, db: Session) -> User | None:
     :return: The first user with the specified email address
     :doc-author: Trelent
     """
-    return db.query(User).filter(User.email == email).first()
+    return db.scalars(USER_BY_EMAIL, {"email": email}).first()
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: Session) -> User | None:
     """
     The create_user function creates a new user in the database.
+        The insert is a single INSERT ... ON CONFLICT (email) DO NOTHING RETURNING statement,
+        so there is no separate lookup and no window in which two signups for the same email can both succeed.
 
     :param body: UserModel: Create a new user object
     :param db: Session: Pass the database session to the function
-    :return: A user object
+    :return: The created user, or None if an account with this email already exists
     :doc-author: Trelent
     """
     avatar = None
@@ -32,42 +47,30 @@ async def create_user(body: UserModel, db: Session) -> User:
         g = Gravatar(body.email)
         avatar = g.get_image()
     except Exception as e:
-        print(e)
-    new_user = User(**body.dict(), avatar=avatar)
-    db.add(new_user)
+        logger.warning("Could not get Gravatar of %s: %s", mask_email(body.email), e)
+    stmt = insert(User).values(**body.dict(), avatar=avatar) \
+        .on_conflict_do_nothing(index_elements=[User.email]) \
+        .returning(User)
+    new_user = db.execute(stmt).scalar_one_or_none()
     db.commit()
-    db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
-    """
-    The update_token function updates the refresh token for a user.
-
-    :param user: User: Pass in the user object
-    :param token: str | None: Update the user's refresh token
-    :param db: Session: Access the database
-    :return: None
-    :doc-author: Trelent
-    """
-    user.refresh_token = token
-    db.commit()
-
-
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: Session) -> bool:
     """
     The confirmed_email function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
-
+        It is a single conditional UPDATE ... WHERE NOT confirmed RETURNING statement,
+        so nothing is written for unknown or already confirmed accounts.
 
     :param email: str: Get the email of the user
     :param db: Session: Pass in the database session
-    :return: Nothing
+    :return: True if the user has just been confirmed, False otherwise
     :doc-author: Trelent
     """
-    user = await get_user_by_email(email, db)
-    user.confirmed = True
+    user_id = db.execute(CONFIRM_EMAIL, {"confirm_email": email}).scalar_one_or_none()
     db.commit()
+    return user_id is not None
 
 
 async def update_avatar(email, url: str, db: Session) -> User:
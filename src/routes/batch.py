@@ -0,0 +1,118 @@
+import re
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi_limiter.depends import RateLimiter
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.connect import get_db, nested_session
+from src.database.models import User
+from src.schema import BatchModel, BatchOperation, BatchResponse, ContactModel, ResponseContact
+from src.repository import contacts as repository_contacts
+from src.services.auth import auth_service
+
+router = APIRouter(prefix='/batch', tags=['batch'])
+
+CONTACTS_PATH = re.compile(r"^(?:/api)?/contacts/?(?:(?P<contact_id>\d+)/?)?$")
+
+
+def _contact(contact) -> dict:
+    return ResponseContact.model_validate(contact, from_attributes=True).model_dump(mode="json")
+
+
+async def run_operation(operation: BatchOperation, user: User, db: Session) -> tuple[int, Any]:
+    """
+    The run_operation function executes one sub-request of a batch against the contacts repository,
+    mirroring the status codes and bodies of the /api/contacts routes.
+
+    :param operation: BatchOperation: The sub-request
+    :param user: User: The authenticated user
+    :param db: Session: The session to run the operation on
+    :return: The status code and body of the sub-request
+    :doc-author: Trelent
+    """
+    match = CONTACTS_PATH.match(operation.path)
+    if match is None:
+        return status.HTTP_404_NOT_FOUND, {"detail": "Not found"}
+    contact_id = int(match["contact_id"]) if match["contact_id"] else None
+
+    if operation.method in ("POST", "PUT"):
+        try:
+            body = ContactModel.model_validate(operation.body or {})
+        except ValidationError as err:
+            return status.HTTP_422_UNPROCESSABLE_ENTITY, {"detail": jsonable_encoder(err.errors(include_url=False))}
+
+    if contact_id is None:
+        if operation.method == "GET":
+            contacts = await repository_contacts.get_contacts(user, db)
+            return status.HTTP_200_OK, [_contact(contact) for contact in contacts]
+        if operation.method == "POST":
+            contact = await repository_contacts.create_contact(body, user, db)
+            return status.HTTP_201_CREATED, _contact(contact)
+    else:
+        if operation.method == "GET":
+            contact = await repository_contacts.get_contact(user, contact_id, db)
+        elif operation.method == "PUT":
+            contact = await repository_contacts.update_contact(body, contact_id, user, db)
+        elif operation.method == "DELETE":
+            contact = await repository_contacts.remove_contact(contact_id, user, db)
+            if contact is not None:
+                return status.HTTP_204_NO_CONTENT, None
+        else:
+            return status.HTTP_405_METHOD_NOT_ALLOWED, {"detail": "Method Not Allowed"}
+        if contact is None:
+            return status.HTTP_404_NOT_FOUND, {"detail": "Not found"}
+        return status.HTTP_200_OK, _contact(contact)
+    return status.HTTP_405_METHOD_NOT_ALLOWED, {"detail": "Method Not Allowed"}
+
+
+@router.post("/", response_model=BatchResponse, dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def batch(body: BatchModel, current_user: User = Depends(auth_service.get_current_user),
+                db: Session = Depends(get_db)):
+    """
+    The batch function runs several contacts operations in one HTTP request.
+        Authentication and rate limiting happen once for the whole batch and every operation runs on the same
+        database session. In atomic mode the operations share one transaction: the first failing operation
+        rolls all of them back and the remaining ones are not executed. Caches are invalidated and events published
+        only once that transaction has committed.
+
+    :param body: BatchModel: The operations and the atomic flag
+    :param current_user: User: Get the current user from the auth_service
+    :param db: Session: Get the database session
+    :return: The status and body of every executed operation and whether their changes were committed
+    :doc-author: Trelent
+    """
+    if len(body.operations) > settings.batch_max_operations:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.batch_max_operations} operations per batch")
+    results = []
+    if not body.atomic:
+        for operation in body.operations:
+            try:
+                code, payload = await run_operation(operation, current_user, db)
+            except SQLAlchemyError:
+                db.rollback()
+                code, payload = status.HTTP_500_INTERNAL_SERVER_ERROR, {"detail": "Database error"}
+            results.append({"status": code, "body": payload})
+        return {"results": results, "committed": True}
+
+    with nested_session(db) as session:
+        changes = repository_contacts.defer_changes(session)
+        for operation in body.operations:
+            try:
+                code, payload = await run_operation(operation, current_user, session)
+            except SQLAlchemyError:
+                code, payload = status.HTTP_500_INTERNAL_SERVER_ERROR, {"detail": "Database error"}
+            results.append({"status": code, "body": payload})
+            if code >= 400:
+                break
+    if results[-1]["status"] >= 400:
+        db.rollback()
+        return {"results": results, "committed": False}
+    db.commit()
+    await repository_contacts.publish_changes(changes)
+    return {"results": results, "committed": True}
@@ -1,39 +1,105 @@
+import asyncio
+import hashlib
+import json
+from datetime import date, datetime, timezone
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from src.conf.config import settings
 from src.database.connect import get_db
 from src.database.models import User
-from src.schema import ResponseContact, ContactModel
+from src.schema import ResponseContact, ResponseContactBatch, ResponseContactChanges, ResponseContactSuggestion, ResponseDuplicateGroup, ContactModel, CONTACT_FIELDS, contact_list_adapter
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services.birthdays import birthday_digest
+from src.services.cache import contacts_cache
+from src.services.events import contact_events, Subscription
+from src.services.idempotency import idempotency
+from src.services.singleflight import SingleFlight
 from fastapi_limiter.depends import RateLimiter
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
+# Identical list reads of one user running at the same time share one query and one serialized body.
+reads = SingleFlight("contacts_reads")
+SUGGEST_FIELDS = ("id", "name", "surname")
+
+
+def contact_fields(fields: str = Query(None, description="Comma-separated subset of contact fields to return")):
+    """
+    The contact_fields dependency parses the fields query parameter into a tuple of ResponseContact field names.
+        The id is always included, and the order is normalized so that equal field sets share one cached model.
+
+    :param fields: str: The comma-separated list of fields
+    :return: A tuple of field names, or None if all fields are requested
+    :doc-author: Trelent
+    """
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in CONTACT_FIELDS if field in requested or field == "id")
+
+
+def contacts_json(contacts, fields: tuple[str, ...] | None) -> bytes:
+    """
+    The contacts_json function serializes contacts with the response model narrowed to the requested fields.
+
+    :param contacts: The contacts to serialize
+    :param fields: tuple[str, ...] | None: The fields to keep, all of them if None
+    :return: The JSON encoded list of contacts
+    :doc-author: Trelent
+    """
+    adapter = contact_list_adapter(fields or CONTACT_FIELDS)
+    return adapter.dump_json(adapter.validate_python(contacts))
+
+
+def json_response(content: bytes) -> Response:
+    return Response(content=content, media_type="application/json")
 
 
 @router.post("/", response_model=ResponseContact, status_code=status.HTTP_201_CREATED, dependencies=[Depends(RateLimiter(times=2, seconds=5))])
 async def create_contact(body: ContactModel, current_user: User = Depends(auth_service.get_current_user),
-                         db: Session = Depends(get_db)):
+                         db: Session = Depends(get_db),
+                         idempotency_key: str = Header(None, max_length=255,
+                                                       description="Retries with the same key return the first response")):
     """
     The create_contact function creates a new contact in the database.
         The function takes a ContactModel object as input, which is validated by pydantic.
         The current_user is retrieved from the auth_service and passed to repository_contacts for validation purposes.
         A database session is also passed to repository_contacts.
+        With an Idempotency-Key header the contact is created once, and retries get the stored response.
 
     :param body: ContactModel: Pass the contact model to the function
     :param current_user: User: Get the user that is currently logged in
     :param db: Session: Get the database session
+    :param idempotency_key: str: Identify retries of the same request
     :return: A contactmodel object
     :doc-author: Trelent
     """
-    contact = await repository_contacts.create_contact(body, current_user, db)
-    return contact
+    if idempotency_key is None:
+        contact = await repository_contacts.create_contact(body, current_user, db)
+        return contact
+
+    async def create():
+        contact = await repository_contacts.create_contact(body, current_user, db)
+        return status.HTTP_201_CREATED, ResponseContact.model_validate(contact, from_attributes=True).model_dump_json()
+
+    fingerprint = hashlib.sha256(body.model_dump_json().encode()).hexdigest()
+    status_code, content, replayed = await idempotency.execute(f"{current_user.id}:create_contact", idempotency_key,
+                                                               fingerprint, create)
+    return Response(content=content, status_code=status_code, media_type="application/json",
+                    headers={"Idempotent-Replayed": str(replayed).lower()})
 
 
 @router.get("/", response_model=List[ResponseContact], dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def get_contacts(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+async def get_contacts(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db),
+                       fields: tuple[str, ...] | None = Depends(contact_fields)):
     """
     The get_contacts function returns a list of contacts for the current user.
         The function takes in two parameters:
@@ -42,11 +108,15 @@ async def get_contacts(current_user: User = Depends(auth_service.get_current_use
 
     :param current_user: User: Get the current user, and db: session is used to connect to the database
     :param db: Session: Pass the database session to the function
+    :param fields: tuple[str, ...] | None: Return only these fields
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contacts(current_user, db)
-    return contact
+    async def load():
+        contacts = await repository_contacts.get_contacts(current_user, db, fields)
+        return contacts_json(contacts, fields)
+
+    return json_response(await reads.do((current_user.id, "get_contacts", fields), load))
 
 
 @router.get("/upcoming_birthdays", response_model=List[ResponseContact], dependencies=[Depends(RateLimiter(times=2, seconds=5))])
@@ -55,21 +125,35 @@ async def get_upcoming_birthdays(current_user: User = Depends(auth_service.get_c
     The get_upcoming_birthdays function returns a list of contacts with upcoming birthdays.
         The current_user parameter is the user who is currently logged in and making the request.
         The db parameter is an instance of Session that will be used to query the database.
+        The answer is read from the daily birthday digest, falling back to the cache and the database.
 
     :param current_user: User: Get the current user
     :param db: Session: Pass the database session to the function
     :return: A list of contacts that have upcoming birthdays
     :doc-author: Trelent
     """
-    contact = await repository_contacts.upcoming_birthdays(current_user, db)
-    return contact
+    async def load():
+        contacts = await repository_contacts.upcoming_birthdays(current_user, db)
+        return [ResponseContact.model_validate(contact, from_attributes=True).model_dump(mode="json")
+                for contact in contacts]
+
+    async def render():
+        digest = await birthday_digest.get(current_user.id, today)
+        if digest is not None:
+            return digest.encode()
+        key = f"upcoming_birthdays:{today}"
+        return json.dumps(await contacts_cache.get_or_load(current_user.id, key, load)).encode()
+
+    today = date.today()
+    return json_response(await reads.do((current_user.id, "upcoming_birthdays", today), render))
 
 
 @router.get("/find", response_model=List[ResponseContact], dependencies=[Depends(RateLimiter(times=2, seconds=5))])
 async def read_contacts(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db),
                         name: str = Query(None, alias="name", ),
                         surname: str = Query(None, alias="surname"),
-                        email: str = Query(None, alias="email")):
+                        email: str = Query(None, alias="email"),
+                        fields: tuple[str, ...] | None = Depends(contact_fields)):
     """
     The read_contacts function is used to read all contacts from the database.
         The function takes in a current_user, db, name, surname and email as parameters.
@@ -84,11 +168,169 @@ async def read_contacts(current_user: User = Depends(auth_service.get_current_us
     :param alias: Change the name of the parameter in the query string
     :param email: str: Query the database for a specific email address
     :param alias: Change the name of the parameter in the query string
+    :param fields: tuple[str, ...] | None: Return only these fields
     :return: A list of contacts that match the search criteria
     :doc-author: Trelent
     """
-    contact = await repository_contacts.read_contacts(current_user, db, name, surname, email)
-    return contact
+    contact = await repository_contacts.read_contacts(current_user, db, name, surname, email, fields)
+    return json_response(contacts_json(contact, fields))
+
+
+@router.get("/lookup", response_model=List[ResponseContact], dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def lookup_contacts(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db),
+                          phone: str = Query(None, description="Phone number in any format"),
+                          email: str = Query(None, description="Email address in any case"),
+                          fields: tuple[str, ...] | None = Depends(contact_fields)):
+    """
+    The lookup_contacts function returns the contacts with exactly this phone number and/or email.
+        Both are normalized first, so "+380 93 204 48 73" finds a contact saved as "0932044873".
+
+    :param current_user: User: Get the user that is currently logged in
+    :param db: Session: Get the database session
+    :param phone: str: The phone number to look up
+    :param email: str: The email address to look up
+    :param fields: tuple[str, ...] | None: Return only these fields
+    :return: A list of matching contacts
+    :doc-author: Trelent
+    """
+    if phone is None and email is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass phone or email")
+    contacts = await repository_contacts.lookup_contacts(current_user, db, phone, email)
+    return json_response(contacts_json(contacts, fields))
+
+
+@router.get("/suggest", response_model=List[ResponseContactSuggestion])
+async def suggest_contacts(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db),
+                           prefix: str = Query(..., min_length=1, max_length=50),
+                           limit: int = Query(10, ge=1, le=50)):
+    """
+    The suggest_contacts function returns as-you-type suggestions of contacts whose name or surname starts with prefix.
+        It is meant to be called on every keystroke, so it is not rate limited like the other reads.
+
+    :param current_user: User: Get the user that is currently logged in
+    :param db: Session: Get the database session
+    :param prefix: str: What the user has typed so far
+    :param limit: int: The maximum number of suggestions
+    :return: A list of contact ids, names and surnames
+    :doc-author: Trelent
+    """
+    contacts = await repository_contacts.suggest_contacts(current_user, prefix, limit, db)
+    return json_response(contacts_json(contacts, SUGGEST_FIELDS))
+
+
+@router.get("/duplicates", response_model=List[ResponseDuplicateGroup],
+            dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def get_duplicates(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+    """
+    The get_duplicates function returns groups of contacts that share a normalized phone number or email.
+
+    :param current_user: User: Get the user that is currently logged in
+    :param db: Session: Get the database session
+    :return: A list of duplicate groups
+    :doc-author: Trelent
+    """
+    groups = await repository_contacts.find_duplicates(current_user, db)
+    return [ResponseDuplicateGroup(matched_on=keys,
+                                   contacts=[ResponseContact.model_validate(contact, from_attributes=True)
+                                             for contact in contacts])
+            for keys, contacts in groups]
+
+
+@router.get("/batch", response_model=ResponseContactBatch, dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def get_contacts_batch(ids: List[int] = Query(), current_user: User = Depends(auth_service.get_current_user),
+                             db: Session = Depends(get_db)):
+    """
+    The get_contacts_batch function returns several contacts by id in one request and one query.
+        Ids that were not found, or belong to another user, are listed in missing.
+
+    :param ids: List[int]: The ids of the contacts, repeated as ?ids=1&ids=2
+    :param current_user: User: Get the current user from the auth_service
+    :param db: Session: Inject the database session into the function
+    :return: The contacts in the requested order and the ids that were not found
+    :doc-author: Trelent
+    """
+    contact_ids = list(dict.fromkeys(ids))
+    if len(contact_ids) > settings.contacts_batch_limit:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.contacts_batch_limit} ids per request")
+    contacts = await repository_contacts.get_contacts_by_ids(current_user, contact_ids, db)
+    found = {contact.id: contact for contact in contacts}
+    return {"contacts": [found[contact_id] for contact_id in contact_ids if contact_id in found],
+            "missing": [contact_id for contact_id in contact_ids if contact_id not in found]}
+
+
+@router.get("/changes", response_model=ResponseContactChanges,
+            dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+async def get_changes(since: datetime = Query(None), current_user: User = Depends(auth_service.get_current_user),
+                      db: Session = Depends(get_db)):
+    """
+    The get_changes function returns the contacts changed and the ids of the contacts deleted since the cursor.
+        Without since it returns every contact, which is how a client starts syncing. The returned cursor is
+        passed as since on the next call. Changes near the cursor can be returned twice. When full_sync is set,
+        because since was missing or older than the tombstone retention, changed holds every contact and the client
+        replaces its copy with it.
+
+    :param since: datetime: The cursor returned by the previous call
+    :param current_user: User: Get the current user from the auth_service
+    :param db: Session: Inject the database session into the function
+    :return: The changed contacts, the deleted ids and the next cursor
+    :doc-author: Trelent
+    """
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    contacts, tombstones, cursor, full_sync = await repository_contacts.get_changes(current_user, since, db)
+    return {"changed": contacts, "deleted": [tombstone.contact_id for tombstone in tombstones], "cursor": cursor,
+            "full_sync": full_sync}
+
+
+async def event_stream(request: Request, subscription: Subscription):
+    """
+    The event_stream function renders the events of a subscription as Server-Sent Events.
+        A comment line is sent every sse_heartbeat seconds to keep idle connections open through proxies,
+        and an overflow event tells a client that fell too far behind to resync via /contacts/changes.
+
+    :param request: Request: Detect client disconnects
+    :param subscription: Subscription: The queue of events to send
+    :return: An async generator of SSE frames
+    :doc-author: Trelent
+    """
+    try:
+        yield f"retry: {settings.sse_heartbeat * 1000}\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(subscription.queue.get(), timeout=settings.sse_heartbeat)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if data is None:
+                yield "event: overflow\ndata: {}\n\n"
+                break
+            yield f"event: contact\ndata: {data}\n\n"
+    finally:
+        contact_events.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_changes(request: Request, current_user: User = Depends(auth_service.get_current_user),
+                         db: Session = Depends(get_db)):
+    """
+    The stream_changes function streams the current user's contact changes as Server-Sent Events.
+        Each event carries the change type and the contact id; clients fetch the data itself through
+        /contacts/changes or /contacts/batch. The database session is closed before streaming starts,
+        so an open stream does not hold a pooled connection.
+
+    :param request: Request: Detect client disconnects
+    :param current_user: User: Get the current user from the auth_service
+    :param db: Session: The session used to authenticate the request
+    :return: A text/event-stream response
+    :doc-author: Trelent
+    """
+    db.close()
+    subscription = contact_events.subscribe(current_user.id)
+    return StreamingResponse(event_stream(request, subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @router.get("/{contact_id}", response_model=ResponseContact, dependencies=[Depends(RateLimiter(times=2, seconds=5))])
@@ -103,7 +345,12 @@ async def get_contact(current_user: User = Depends(auth_service.get_current_user
     :return: A contact object, which is defined in the models
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact(current_user, contact_id, db)
+    async def load():
+        contact = await repository_contacts.get_contact(current_user, contact_id, db)
+        if contact is not None:
+            return ResponseContact.model_validate(contact, from_attributes=True).model_dump(mode="json")
+
+    contact = await contacts_cache.get_or_load(current_user.id, f"contact:{contact_id}", load)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Not found")
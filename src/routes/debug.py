@@ -0,0 +1,170 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.blocking import blocking_detector
+from src.services.memory import memory_tracker
+from src.services.profiling import profile_store
+
+router = APIRouter(prefix='/debug', tags=["debug"])
+
+KeyType = Literal["lineno", "filename", "traceback"]
+
+
+@router.get("/loop_blocks")
+async def read_loop_blocks(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_loop_blocks function returns the stalls of the event loop this worker has recorded, newest first,
+        each with the route that was running and a sampled stack, and the total blocking time per route.
+        Nothing is recorded unless LOOP_BLOCK_DETECTOR is set.
+
+    :param current_user: User: Check that the user is an admin
+    :return: The report of the blocking detector
+    :doc-author: Trelent
+    """
+    return blocking_detector.report()
+
+
+@router.get("/profiles")
+async def read_profiles(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_profiles function lists the requests this worker has profiled, newest first.
+        An admin profiles a request by sending it with the X-Profile header or the profile query parameter.
+
+    :param current_user: User: Check that the user is an admin
+    :return: The id, route, status and duration of every stored profile
+    :doc-author: Trelent
+    """
+    return profile_store.list()
+
+
+@router.get("/profiles/{profile_id}")
+async def read_profile(profile_id: str, format: Literal["pstats", "text"] = Query("pstats"),
+                       sort: str = Query("cumulative"), limit: int = Query(50, ge=1, le=1000),
+                       current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_profile function downloads a profile, either as a pstats file (python -m pstats, snakeviz, gprof2dot)
+        or as the text report of pstats sorted by the given key.
+
+    :param profile_id: str: The id from the X-Profile-Id header of the profiled response
+    :param format: str: pstats or text
+    :param sort: str: The sort key of the text report
+    :param limit: int: The number of functions in the text report
+    :param current_user: User: Check that the user is an admin
+    :return: The profile
+    :doc-author: Trelent
+    """
+    if format == "text":
+        try:
+            body = profile_store.text(profile_id, sort, limit)
+        except KeyError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sort key")
+    else:
+        body = profile_store.dump(profile_id)
+    if body is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "text":
+        return Response(body, media_type="text/plain")
+    return Response(body, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+
+
+@router.get("/memory")
+async def read_memory(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_memory function returns whether tracemalloc is tracing in this worker, the memory it traces,
+        the snapshots taken so far and, with MEMORY_ROUTE_PEAKS set, the memory allocated per route.
+
+    :param current_user: User: Check that the user is an admin
+    :return: The state of the memory tracker
+    :doc-author: Trelent
+    """
+    return memory_tracker.status()
+
+
+@router.post("/memory/start")
+async def start_memory_tracing(frames: int = Query(settings.memory_trace_frames, ge=1, le=100),
+                               current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The start_memory_tracing function starts tracemalloc in this worker. Tracing slows the worker down
+        and costs memory of its own, so stop it when done.
+
+    :param frames: int: The number of frames stored per allocation
+    :param current_user: User: Check that the user is an admin
+    :return: The state of the memory tracker
+    :doc-author: Trelent
+    """
+    memory_tracker.start(frames)
+    return memory_tracker.status()
+
+
+@router.post("/memory/stop")
+async def stop_memory_tracing(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The stop_memory_tracing function stops tracemalloc. The snapshots taken so far are kept.
+
+    :param current_user: User: Check that the user is an admin
+    :return: The state of the memory tracker
+    :doc-author: Trelent
+    """
+    memory_tracker.stop()
+    return memory_tracker.status()
+
+
+@router.post("/memory/snapshots", status_code=status.HTTP_201_CREATED)
+async def take_memory_snapshot(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The take_memory_snapshot function takes a snapshot of the allocations traced so far.
+
+    :param current_user: User: Check that the user is an admin
+    :return: The id of the snapshot
+    :doc-author: Trelent
+    """
+    if not memory_tracker.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Memory tracing is not started")
+    return {"id": memory_tracker.take_snapshot()}
+
+
+@router.get("/memory/snapshots/{snapshot_id}")
+async def read_memory_snapshot(snapshot_id: int, key_type: KeyType = Query("lineno"),
+                               limit: int = Query(20, ge=1, le=1000),
+                               current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_memory_snapshot function returns the allocation sites that hold the most memory in a snapshot.
+
+    :param snapshot_id: int: The id of the snapshot
+    :param key_type: str: Group by lineno, filename or traceback
+    :param limit: int: The number of sites
+    :param current_user: User: Check that the user is an admin
+    :return: The top allocation sites
+    :doc-author: Trelent
+    """
+    top = memory_tracker.top(snapshot_id, key_type, limit)
+    if top is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+    return top
+
+
+@router.get("/memory/diff")
+async def read_memory_diff(first: int, second: int, key_type: KeyType = Query("lineno"),
+                           limit: int = Query(20, ge=1, le=1000),
+                           current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_memory_diff function returns the allocation sites whose memory changed the most
+        between two snapshots, largest change first.
+
+    :param first: int: The id of the older snapshot
+    :param second: int: The id of the newer snapshot
+    :param key_type: str: Group by lineno, filename or traceback
+    :param limit: int: The number of sites
+    :param current_user: User: Check that the user is an admin
+    :return: The allocation sites with their differences
+    :doc-author: Trelent
+    """
+    diff = memory_tracker.diff(first, second, key_type, limit)
+    if diff is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+    return diff
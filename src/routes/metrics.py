@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+
+from src.database.connect import engine
+from src.database.models import User
+from src.services.admission import admission_control
+from src.services.auth import auth_service
+from src.services.blocking import blocking_detector
+from src.services.memory import memory_tracker
+from src.services.metrics import metrics
+
+router = APIRouter(prefix='/metrics', tags=["metrics"])
+
+
+@router.get("/")
+async def read_metrics(current_user: User = Depends(auth_service.get_current_admin)):
+    """
+    The read_metrics function returns the counters and summaries collected by this worker,
+        together with the occupancy of its database connection pool, the state of admission control,
+        the time the event loop was blocked per route and the memory allocated per route while tracemalloc runs.
+        Like the debug endpoints it is restricted to the users listed in ADMIN_EMAILS.
+
+    :param current_user: User: Check that the user is an admin
+    :return: A snapshot of the metrics
+    :doc-author: Trelent
+    """
+    snapshot = metrics.snapshot()
+    snapshot["db_pool"] = {"size": engine.pool.size(), "checked_out": engine.pool.checkedout()}
+    snapshot["admission"] = admission_control.snapshot()
+    snapshot["loop_blocks"] = blocking_detector.report()["routes"]
+    snapshot["memory"] = memory_tracker.report_routes()
+    return snapshot
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Response
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+router = APIRouter(prefix='/.well-known', tags=["auth"])
+
+
+@router.get("/jwks.json")
+async def jwks(response: Response):
+    """
+    The jwks function publishes the public keys that verify our access tokens,
+    so other services can check tokens locally and cache the key set.
+
+    :param response: Response: Set the caching headers
+    :return: The JSON Web Key Set
+    :doc-author: Trelent
+    """
+    response.headers["Cache-Control"] = f"public, max-age={settings.jwks_max_age}"
+    return auth_service.key_ring.jwks()
@@ -1,6 +1,8 @@
 from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, List, Literal
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter, create_model
 
 
 class OwnerModel(BaseModel):
@@ -61,6 +63,71 @@ class ResponseContact(BaseModel):
         orm_mode = True
 
 
+class ResponseContactBatch(BaseModel):
+    contacts: List[ResponseContact]
+    missing: List[int]
+
+
+class ResponseContactChanges(BaseModel):
+    changed: List[ResponseContact]
+    deleted: List[int]
+    cursor: datetime
+    full_sync: bool
+
+
+class ResponseContactSuggestion(BaseModel):
+    id: int
+    name: str
+    surname: str
+
+
+class ResponseDuplicateGroup(BaseModel):
+    matched_on: List[Literal["phone_e164", "email_normalized"]]
+    contacts: List[ResponseContact]
+
+
+class BatchOperation(BaseModel):
+    method: Literal["GET", "POST", "PUT", "DELETE"]
+    path: str = Field(examples=["/contacts/1"])
+    body: dict | None = None
+
+
+class BatchModel(BaseModel):
+    operations: List[BatchOperation] = Field(min_length=1)
+    atomic: bool = False
+
+
+class BatchResult(BaseModel):
+    status: int
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+    committed: bool
+
+
+CONTACT_FIELDS = tuple(ResponseContact.model_fields)
+
+
+@lru_cache(maxsize=128)
+def contact_list_adapter(fields: tuple[str, ...]) -> TypeAdapter:
+    """
+    The contact_list_adapter function builds a response model holding only the requested ResponseContact fields
+    and returns a TypeAdapter for a list of it. Models are cached per field set, so each variant is built once.
+
+    :param fields: tuple[str, ...]: The fields to keep, in CONTACT_FIELDS order
+    :return: A TypeAdapter that validates and serializes a list of contacts
+    :doc-author: Trelent
+    """
+    model = create_model(
+        "ResponseContact_" + "_".join(fields),
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (ResponseContact.model_fields[name].annotation, ...) for name in fields},
+    )
+    return TypeAdapter(List[model])
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
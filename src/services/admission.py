@@ -0,0 +1,118 @@
+from typing import Callable
+
+from fastapi import status
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.database.connect import pool_occupancy
+from src.services.loop_monitor import loop_monitor
+from src.services.metrics import metrics
+
+CRITICAL, NORMAL, LOW, EXEMPT = "critical", "normal", "low", "exempt"
+
+
+def path_prefixes(value: str) -> tuple[str, ...]:
+    return tuple(prefix.strip() for prefix in value.split(",") if prefix.strip())
+
+
+class AdmissionControl:
+    """
+    Decides which requests this worker takes on, from how loaded it is.
+
+    The pressure is the highest of three ratios: requests in flight to max_in_flight, database connections checked
+    out to the pool's capacity, and event loop lag to max_loop_lag. Low priority requests (searches, exports) are
+    turned away from shed_low_at on, before queueing for connections makes everyone slow; normal ones only once
+    the worker is saturated (pressure 1). Critical requests (auth) are always let through, and exempt ones (long
+    lived streams) are neither counted nor refused.
+    """
+
+    def __init__(self, max_in_flight: int, max_loop_lag: float, shed_low_at: float,
+                 pool_occupancy: Callable[[], float], loop_lag: Callable[[], float],
+                 critical: tuple[str, ...] = (), low: tuple[str, ...] = (), exempt: tuple[str, ...] = ()):
+        self.max_in_flight = max_in_flight
+        self.max_loop_lag = max_loop_lag
+        self.shed_low_at = shed_low_at
+        self.pool_occupancy = pool_occupancy
+        self.loop_lag = loop_lag
+        self.classes = [(prefix, EXEMPT) for prefix in exempt] + [(prefix, CRITICAL) for prefix in critical] \
+            + [(prefix, LOW) for prefix in low]
+        self.classes.sort(key=lambda item: len(item[0]), reverse=True)
+        self.in_flight = 0
+
+    def priority(self, path: str) -> str:
+        return next((priority for prefix, priority in self.classes if path.startswith(prefix)), NORMAL)
+
+    def pressure(self) -> float:
+        """
+        The pressure function returns how close the worker is to saturation, 1 meaning saturated.
+
+        :param self: Represent the instance of the class
+        :return: The highest of the in-flight, pool and loop lag ratios
+        :doc-author: Trelent
+        """
+        return max(self.in_flight / self.max_in_flight, self.pool_occupancy(), self.loop_lag() / self.max_loop_lag)
+
+    def admit(self, priority: str) -> bool:
+        """
+        The admit function decides whether a request of the given priority is taken on now.
+
+        :param self: Represent the instance of the class
+        :param priority: str: critical, normal or low
+        :return: True if the request may run
+        :doc-author: Trelent
+        """
+        if priority == CRITICAL:
+            return True
+        pressure = self.pressure()
+        if pressure >= 1 or (priority == LOW and pressure >= self.shed_low_at):
+            metrics.inc(f"admission_shed_{priority}")
+            return False
+        return True
+
+    def snapshot(self) -> dict:
+        return {"in_flight": self.in_flight, "pressure": round(self.pressure(), 3),
+                "pool_occupancy": round(self.pool_occupancy(), 3), "loop_lag": round(self.loop_lag(), 4)}
+
+
+class AdmissionMiddleware:
+    """
+    Answers the requests AdmissionControl turns away with 503 and Retry-After, and counts the others in flight.
+    """
+
+    def __init__(self, app: ASGIApp, control: AdmissionControl, retry_after: int = 1):
+        self.app = app
+        self.control = control
+        self.retry_after = str(retry_after)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority = self.control.priority(scope["path"])
+        if priority == EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        if not self.control.admit(priority):
+            response = JSONResponse({"detail": "Server is busy, retry later"},
+                                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={"Retry-After": self.retry_after})
+            await response(scope, receive, send)
+            return
+        self.control.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.in_flight -= 1
+
+
+admission_control = AdmissionControl(
+    max_in_flight=settings.admission_max_in_flight,
+    max_loop_lag=settings.admission_max_loop_lag,
+    shed_low_at=settings.admission_shed_low_at,
+    pool_occupancy=pool_occupancy,
+    loop_lag=lambda: loop_monitor.lag,
+    critical=path_prefixes(settings.admission_critical),
+    low=path_prefixes(settings.admission_low),
+    exempt=path_prefixes(settings.admission_exempt),
+)
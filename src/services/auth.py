@@ -1,6 +1,8 @@
+import logging
 from typing import Optional
+from uuid import uuid4
 
-from jose import JWTError, jwt
+from jose import JWTError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
@@ -8,14 +10,19 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
 from src.database.connect import get_db
+from src.database.routing import session_user
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services import keys
+from src.services.logs import bind
+
+logger = logging.getLogger(__name__)
 
 
 class Auth:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    SECRET_KEY = settings.secret_key_jwt
-    ALGORITHM = settings.algorithm
+    key_ring = keys.key_ring
+    REFRESH_TOKEN_TTL = settings.refresh_token_ttl
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
     def verify_password(self, plain_password, hashed_password):
@@ -47,8 +54,7 @@ class Auth:
     def create_email_token(self, data: dict):
         """
         The create_email_token function takes a dictionary of data and returns a token.
-        The token is encoded with the SECRET_KEY, which is stored in the .env file.
-        The algorithm used to encode the token is also stored in the .env file.
+        The token is signed with the active key of the key ring.
 
         :param self: Make the function a method of the class
         :param data: dict: Pass in the data that we want to encode into the token
@@ -58,7 +64,7 @@ class Auth:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=1)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "email_token"})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        token = self.key_ring.encode(to_encode)
         return token
 
     # define a function to generate a new access token
@@ -82,7 +88,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_access_token = self.key_ring.encode(to_encode)
         return encoded_access_token
 
     # define a function to generate a new refresh token
@@ -92,6 +98,7 @@ class Auth:
             Args:
                 data (dict): A dictionary containing the user's id and username.
                 expires_delta (Optional[float]): The number of seconds until the token expires, defaults to None.
+            Every refresh token gets a unique jti claim, which identifies the session in the refresh token store.
 
         :param self: Represent the instance of the class
         :param data: dict: Pass the data that will be encoded in the token
@@ -103,28 +110,28 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=self.REFRESH_TOKEN_TTL)
+        to_encode.setdefault("jti", uuid4().hex)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_refresh_token = self.key_ring.encode(to_encode)
         return encoded_refresh_token
 
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function is used to decode the refresh token.
-        It takes a refresh_token as an argument and returns the email of the user if it's valid.
+        It takes a refresh_token as an argument and returns its claims if it's valid.
         If not, it raises an HTTPException with status code 401 (UNAUTHORIZED) and detail 'Could not validate credentials'.
 
 
         :param self: Represent the instance of the class
         :param refresh_token: str: Decode the refresh token
-        :return: The email address of the user associated with the refresh token
+        :return: The claims of the refresh token: sub (the user's email), jti, gen and exp
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.key_ring.decode(refresh_token)
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
@@ -149,7 +156,7 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.key_ring.decode(token)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -159,9 +166,56 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
+        session_user.set(email)
         user = await repository_users.get_user_by_email(email, db)
         if user is None:
             raise credentials_exception
+        bind(user_id=user.id)
+        return user
+
+    def is_admin(self, email: str) -> bool:
+        """
+        The is_admin function checks whether the email is listed in ADMIN_EMAILS.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :return: True if the user is an admin
+        :doc-author: Trelent
+        """
+        return email.lower() in {admin.strip().lower() for admin in settings.admin_emails.split(",") if admin.strip()}
+
+    def admin_from_token(self, token: str) -> str | None:
+        """
+        The admin_from_token function returns the email of an admin from their access token, without a database query,
+        or None if the token is invalid or does not belong to an admin.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token
+        :return: The email of the admin or None
+        :doc-author: Trelent
+        """
+        try:
+            payload = self.key_ring.decode(token)
+        except JWTError:
+            return None
+        if payload.get('scope') != 'access_token' or not payload.get('sub') or not self.is_admin(payload['sub']):
+            return None
+        return payload['sub']
+
+    async def get_current_admin(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        """
+        The get_current_admin function is a dependency for the debug endpoints.
+            It returns the current user if their email is listed in ADMIN_EMAILS, and raises 403 otherwise.
+
+        :param self: Represent the instance of the class
+        :param token: str: Get the token from the authorization header
+        :param db: Session: Pass the database session to the function
+        :return: A user object
+        :doc-author: Trelent
+        """
+        user = await self.get_current_user(token, db)
+        if not self.is_admin(user.email):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operation not permitted")
         return user
 
     async def get_email_from_token(self, token: str):
@@ -177,13 +231,13 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.key_ring.decode(token)
             if payload['scope'] == 'email_token':
                 email = payload["sub"]
                 return email
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError as e:
-            print(e)
+            logger.info("Invalid email verification token: %s", e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for email verification")
 
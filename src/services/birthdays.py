@@ -0,0 +1,121 @@
+import logging
+from datetime import date, timedelta
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect import redis_client
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BirthdayDigest:
+    """
+    Upcoming birthdays of every user, precomputed once a day by the birthday digest job.
+
+    A digest is a Redis hash per day with one field per user holding the JSON response of
+    /contacts/upcoming_birthdays, so a read is a single HGET. A missing field means "unknown": users created after
+    the job ran and users whose contacts changed since are served from the database instead.
+
+    The job builds the hash under a temporary key and renames it into place. Writes made while it runs are
+    recorded in a dirty set, and their fields are dropped right after the rename, so the job cannot put back an
+    answer that a write has made stale.
+    """
+
+    def __init__(self, r: Redis, ttl: int):
+        self.r = r
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(day: date) -> str:
+        return f"birthdays:{day.isoformat()}"
+
+    async def get(self, user_id: int, day: date) -> str | None:
+        """
+        The get function returns the stored upcoming birthdays of the user for the day.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user
+        :param day: date: The day of the digest
+        :return: The JSON list of contacts, or None if it is not in the digest
+        :doc-author: Trelent
+        """
+        try:
+            digest = await self.r.hget(self._key(day), str(user_id))
+        except RedisError as err:
+            logger.warning("Birthday digest unavailable: %s", err)
+            metrics.inc("birthday_digest_errors")
+            return None
+        metrics.inc("birthday_digest_hits" if digest is not None else "birthday_digest_misses")
+        return digest
+
+    async def start(self, day: date) -> None:
+        """
+        The start function prepares an empty digest for the day, to be filled with add and published with publish.
+
+        :param self: Represent the instance of the class
+        :param day: date: The day of the digest
+        :return: None
+        :doc-author: Trelent
+        """
+        await self.r.delete(f"{self._key(day)}:building", f"{self._key(day)}:dirty")
+
+    async def add(self, day: date, digests: dict[int, str]) -> None:
+        """
+        The add function writes a batch of per user digests into the digest being built.
+
+        :param self: Represent the instance of the class
+        :param day: date: The day of the digest
+        :param digests: dict[int, str]: The JSON list of contacts of every user in the batch
+        :return: None
+        :doc-author: Trelent
+        """
+        if digests:
+            await self.r.hset(f"{self._key(day)}:building", mapping={str(user_id): digest
+                                                                     for user_id, digest in digests.items()})
+
+    async def publish(self, day: date) -> None:
+        """
+        The publish function replaces the digest of the day with the one built, dropping users changed meanwhile.
+            At least one batch must have been added.
+
+        :param self: Represent the instance of the class
+        :param day: date: The day of the digest
+        :return: None
+        :doc-author: Trelent
+        """
+        key = self._key(day)
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.rename(f"{key}:building", key)
+            pipe.expire(key, self.ttl)
+            pipe.smembers(f"{key}:dirty")
+            *_, dirty = await pipe.execute()
+        if dirty:
+            await self.r.hdel(key, *dirty)
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        The invalidate function drops the user from the digests of today and tomorrow.
+            It must be called after the write that changed the user's contacts has been committed.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user whose contacts changed
+        :return: None
+        :doc-author: Trelent
+        """
+        today = date.today()
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                for day in (today, today + timedelta(days=1)):
+                    pipe.hdel(self._key(day), str(user_id))
+                    pipe.sadd(f"{self._key(day)}:dirty", str(user_id))
+                    pipe.expire(f"{self._key(day)}:dirty", self.ttl)
+                await pipe.execute()
+        except RedisError as err:
+            logger.warning("Could not invalidate birthday digest: %s", err)
+            metrics.inc("birthday_digest_errors")
+
+
+birthday_digest = BirthdayDigest(redis_client, settings.birthday_digest_ttl)
@@ -0,0 +1,158 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.services.metrics import metrics
+
+
+class BlockingDetector:
+    """
+    Finds the code that blocks the event loop of this worker.
+
+    A heartbeat task on the loop ticks every interval seconds and measures how late it runs. A watchdog thread
+    notices when the heartbeat has been silent for longer than threshold, i.e. while the loop is still blocked, and
+    samples the stack of the loop's thread and the route of the request whose task is running. When the heartbeat
+    comes back, the episode is recorded with its duration. Episodes too short for the watchdog to catch are recorded
+    without a stack.
+
+    Opt-in: nothing runs unless start() is called, and routes are only attributed with BlockingMiddleware installed.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.01, history: int = 100, stack_depth: int = 30):
+        self.threshold = threshold
+        self.interval = interval
+        self.stack_depth = stack_depth
+        self.episodes: deque[dict] = deque(maxlen=history)
+        self.routes: dict[str, dict[str, float]] = {}
+        self.scopes: dict[asyncio.Task, Scope] = {}
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._beat = time.monotonic()
+        self._sampled_beat: float | None = None
+        self._sample: dict | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        The start function starts the heartbeat on the running loop and the watchdog thread.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def route(self, task: asyncio.Task | None) -> str | None:
+        scope = self.scopes.get(task)
+        if scope is None:
+            return None
+        route = scope.get("route")
+        return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._beat = time.monotonic()
+            if lag >= self.threshold:
+                self._record(lag)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            if time.monotonic() - beat <= self.threshold or beat == self._sampled_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            sample = {
+                "route": self.route(asyncio.current_task(self._loop)),
+                "stack": traceback.format_stack(frame)[-self.stack_depth:] if frame is not None else None,
+            }
+            with self._lock:
+                self._sampled_beat = beat
+                self._sample = sample
+
+    def _record(self, duration: float) -> None:
+        with self._lock:
+            sample, self._sample = self._sample or {"route": None, "stack": None}, None
+        route = sample["route"] or "unknown"
+        self.episodes.append({"at": time.time(), "duration": round(duration, 4), **sample, "route": route})
+        stats = self.routes.setdefault(route, {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += duration
+        stats["max"] = max(stats["max"], duration)
+        metrics.inc("loop_blocks")
+        metrics.observe("loop_block_seconds", duration)
+
+    def report(self) -> dict:
+        """
+        The report function returns the recorded episodes, newest first, and the blocking time per route.
+
+        :param self: Represent the instance of the class
+        :return: The state of the detector
+        :doc-author: Trelent
+        """
+        routes = sorted(self.routes.items(), key=lambda item: item[1]["total"], reverse=True)
+        return {"enabled": self.running, "threshold": self.threshold,
+                "routes": {route: {**stats, "total": round(stats["total"], 4), "max": round(stats["max"], 4)}
+                           for route, stats in routes},
+                "episodes": list(reversed(self.episodes))}
+
+
+class BlockingMiddleware:
+    """
+    Remembers which request each task is serving, so BlockingDetector can name the route that blocked the loop.
+    """
+
+    def __init__(self, app: ASGIApp, detector: BlockingDetector):
+        self.app = app
+        self.detector = detector
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        self.detector.scopes[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.detector.scopes.pop(task, None)
+
+
+blocking_detector = BlockingDetector(settings.loop_block_threshold)
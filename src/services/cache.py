@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, WatchError
+
+from src.conf.config import settings
+from src.database.connect import pubsub_client, redis_client
+from src.services.metrics import metrics
+from src.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:contacts:invalidate"
+
+
+class ContactCache:
+    """
+    Read-through cache for contacts reads: an in-process LRU in front of Redis.
+
+    Entries are namespaced per user. In Redis all entries of a user live in one hash, so invalidating a user is a
+    single DEL; a per-user generation counter guards the fill, so a value loaded before an invalidation is never
+    written back after it. Invalidations are broadcast on a pub/sub channel and every worker drops its local
+    entries of that user; the short local TTL bounds staleness if a broadcast is missed.
+
+    Concurrent misses for the same key are loaded once per worker, and across workers a short Redis lock lets one
+    of them load while the others wait for the value to appear.
+
+    Commands go through r; the subscription is held on subscriber, a client without a read timeout, as it waits
+    for as long as nobody invalidates anything.
+    """
+
+    def __init__(self, r: Redis, subscriber: Redis, max_entries: int, local_ttl: float, ttl: int, lock_ttl: float):
+        self.r = r
+        self.subscriber = subscriber
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self._local: OrderedDict[tuple[int, str], tuple[float, Any]] = OrderedDict()
+        self._user_keys: dict[int, set[str]] = defaultdict(set)
+        self._local_generations: dict[int, int] = defaultdict(int)
+        self._flight = SingleFlight("cache")
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _hash_key(user_id: int) -> str:
+        return f"cache:contacts:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: int) -> str:
+        return f"cache:contacts:{user_id}:gen"
+
+    async def get_or_load(self, user_id: int, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        The get_or_load function returns the cached value of key for the user, calling loader on a miss.
+            Values must be JSON serializable; a None result is returned but not cached.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The namespace of the entry
+        :param key: str: The key of the entry within the user's namespace
+        :param loader: Callable[[], Awaitable[Any]]: Load the value from the database
+        :return: The cached or freshly loaded value
+        :doc-author: Trelent
+        """
+        self._ensure_listening()
+        entry = self._local.get((user_id, key))
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._local.move_to_end((user_id, key))
+                metrics.inc("cache_local_hits")
+                return entry[1]
+            self._drop_local_key(user_id, key)
+
+        return await self._flight.do((user_id, key), lambda: self._load(user_id, key, loader))
+
+    async def _load(self, user_id: int, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        local_generation = self._local_generations[user_id]
+        lock_key = f"{self._hash_key(user_id)}:lock:{key}"
+        locked = False
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.hget(self._hash_key(user_id), key)
+                pipe.get(self._generation_key(user_id))
+                cached, generation = await pipe.execute()
+            if cached is None:
+                locked = await self.r.set(lock_key, 1, nx=True, px=int(self.lock_ttl * 1000))
+                if not locked:
+                    cached = await self._wait_for_fill(user_id, key)
+        except RedisError as err:
+            logger.warning("Contacts cache unavailable: %s", err)
+            metrics.inc("cache_errors")
+            return await loader()
+
+        if cached is not None:
+            metrics.inc("cache_redis_hits")
+            value = json.loads(cached)
+        else:
+            metrics.inc("cache_misses")
+            try:
+                value = await loader()
+                # invalidated while loading: the value may predate the write, so it is not kept locally either
+                current = value is not None and await self._fill(user_id, key, value, generation)
+            finally:
+                if locked:
+                    await self._release(lock_key)
+            if not current:
+                return value
+        if value is not None and self._local_generations[user_id] == local_generation:
+            self._store_local(user_id, key, value)
+        return value
+
+    async def _wait_for_fill(self, user_id: int, key: str) -> str | None:
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            cached = await self.r.hget(self._hash_key(user_id), key)
+            if cached is not None:
+                return cached
+        return None
+
+    async def _fill(self, user_id: int, key: str, value: Any, generation: str | None) -> bool:
+        try:
+            async with self.r.pipeline(transaction=True) as pipe:
+                await pipe.watch(self._generation_key(user_id))
+                if await pipe.get(self._generation_key(user_id)) != generation:
+                    return False
+                pipe.multi()
+                pipe.hset(self._hash_key(user_id), key, json.dumps(value, default=str))
+                pipe.expire(self._hash_key(user_id), self.ttl)
+                await pipe.execute()
+        except WatchError:
+            return False
+        except RedisError as err:
+            logger.warning("Contacts cache unavailable: %s", err)
+            metrics.inc("cache_errors")
+        return True
+
+    async def _release(self, lock_key: str) -> None:
+        try:
+            await self.r.delete(lock_key)
+        except RedisError:
+            pass
+
+    def _store_local(self, user_id: int, key: str, value: Any) -> None:
+        self._local[(user_id, key)] = (time.monotonic() + self.local_ttl, value)
+        self._local.move_to_end((user_id, key))
+        self._user_keys[user_id].add(key)
+        while len(self._local) > self.max_entries:
+            (evicted_user, evicted_key), _ = self._local.popitem(last=False)
+            self._discard_user_key(evicted_user, evicted_key)
+            metrics.inc("cache_evictions")
+
+    def _drop_local_key(self, user_id: int, key: str) -> None:
+        self._local.pop((user_id, key), None)
+        self._discard_user_key(user_id, key)
+
+    def _discard_user_key(self, user_id: int, key: str) -> None:
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def drop_local(self, user_id: int) -> None:
+        """
+        The drop_local function forgets every entry of the user held by this worker.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user whose entries are dropped
+        :return: None
+        :doc-author: Trelent
+        """
+        self._local_generations[user_id] += 1
+        for key in self._user_keys.pop(user_id, ()):
+            self._local.pop((user_id, key), None)
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        The invalidate function drops every cached entry of the user in Redis and in all workers.
+            It must be called after the write that made the entries stale has been committed.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user whose entries are invalidated
+        :return: None
+        :doc-author: Trelent
+        """
+        self.drop_local(user_id)
+        metrics.inc("cache_invalidations")
+        try:
+            async with self.r.pipeline(transaction=True) as pipe:
+                pipe.incr(self._generation_key(user_id))
+                pipe.expire(self._generation_key(user_id), self.ttl)
+                pipe.delete(self._hash_key(user_id))
+                pipe.publish(INVALIDATION_CHANNEL, user_id)
+                await pipe.execute()
+        except RedisError as err:
+            logger.warning("Could not invalidate contacts cache: %s", err)
+            metrics.inc("cache_errors")
+
+    def _ensure_listening(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.subscriber.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.drop_local(int(message["data"]))
+            except RedisError as err:
+                logger.warning("Contacts cache listener lost Redis: %s", err)
+                self._local.clear()
+                self._user_keys.clear()
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+contacts_cache = ContactCache(redis_client, pubsub_client, settings.cache_max_entries, settings.cache_local_ttl,
+                              settings.cache_ttl, settings.cache_lock_ttl)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+from fastapi import Request, status
+from sqlalchemy.exc import OperationalError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = b"x-request-timeout"
+# SQLSTATE of a statement cancelled by statement_timeout (or by the user)
+QUERY_CANCELED = "57014"
+
+
+class Deadline:
+    """
+    The moment by which the current request has to be answered.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at: float | None = time.monotonic() + seconds
+
+    def remaining(self) -> float | None:
+        return None if self.expires_at is None else self.expires_at - time.monotonic()
+
+    def lift(self) -> None:
+        self.expires_at = None
+
+
+request_deadline: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """
+    The remaining function returns the seconds left until the deadline of the current request.
+
+    :return: The seconds left, negative once the deadline has passed, or None if the request has no deadline
+    :doc-author: Trelent
+    """
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def parse_timeouts(value: str) -> dict[str, float]:
+    """
+    The parse_timeouts function reads per-route timeouts written as comma-separated path=seconds pairs.
+
+    :param value: str: For example "/api/contacts/find=3,/api/contacts/stream=0"
+    :return: The timeout of every path prefix
+    :doc-author: Trelent
+    """
+    timeouts = {}
+    for item in value.split(","):
+        if item.strip():
+            path, seconds = item.rsplit("=", 1)
+            timeouts[path.strip()] = float(seconds)
+    return timeouts
+
+
+def set_statement_timeout(conn) -> None:
+    """
+    The set_statement_timeout function is a begin listener that bounds every PostgreSQL transaction of a request
+        by the time left to its deadline, so a slow query is cancelled by the server and frees its connection
+        instead of running on after the request has given up.
+
+    :param conn: Connection: The connection beginning a transaction
+    :return: None
+    :doc-author: Trelent
+    """
+    seconds = remaining()
+    if seconds is None or conn.dialect.name != "postgresql":
+        return
+    if seconds <= 0:
+        raise TimeoutError("Request deadline exceeded")
+    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(seconds * 1000))}")
+
+
+async def operational_error_handler(request: Request, exc: OperationalError) -> JSONResponse:
+    """
+    The operational_error_handler function answers a request that failed on the database server.
+        A statement cancelled by its timeout is a 504; anything else (lost or refused connections, a full server)
+        is a 503 the client may retry.
+
+    :param request: Request: The failed request
+    :param exc: OperationalError: The database error
+    :return: A 504 or 503 response
+    :doc-author: Trelent
+    """
+    code = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+    if code == QUERY_CANCELED:
+        metrics.inc("deadline_statement_timeouts")
+        return JSONResponse({"detail": "Request timed out"}, status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+    logger.warning("Database unavailable: %s", exc.orig)
+    metrics.inc("database_unavailable")
+    return JSONResponse({"detail": "Database unavailable"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={"Retry-After": "1"})
+
+
+class DeadlineMiddleware:
+    """
+    Gives every HTTP request a deadline and cancels it with a 504 once the deadline passes.
+
+    The timeout is the longest matching path prefix in routes, else default; 0 means no deadline (for streams).
+    Clients may ask for a shorter one with the X-Request-Timeout header (seconds), never a longer one. The deadline
+    is published through request_deadline for the database (see set_statement_timeout) and cancels whatever the
+    request awaits, Redis calls included. Synchronous database calls block the event loop and cannot be cancelled
+    from here, which is what the statement timeout is for. Once the response has been sent the deadline is lifted,
+    so background tasks run to completion.
+    """
+
+    def __init__(self, app: ASGIApp, default: float, routes: dict[str, float] | None = None):
+        self.app = app
+        self.default = default
+        self.routes = sorted((routes or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def timeout(self, scope: Scope) -> float:
+        """
+        The timeout function returns the number of seconds the request may take, 0 for no limit.
+
+        :param self: Represent the instance of the class
+        :param scope: Scope: The ASGI scope of the request
+        :return: The timeout in seconds
+        :doc-author: Trelent
+        """
+        seconds = next((timeout for path, timeout in self.routes if scope["path"].startswith(path)), self.default)
+        for name, value in scope["headers"]:
+            if name == TIMEOUT_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0 and (seconds <= 0 or requested < seconds):
+                    seconds = requested
+                break
+        return seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.timeout(scope)
+        if seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(seconds)
+        timeout = asyncio.timeout(seconds)
+        started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            started = True
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                timeout.reschedule(None)
+                deadline.lift()
+
+        token = request_deadline.set(deadline)
+        try:
+            async with timeout:
+                await self.app(scope, receive, send_wrapper)
+        except TimeoutError:
+            # raised by asyncio.timeout after cancelling the request, or by set_statement_timeout
+            metrics.inc("deadline_exceeded")
+            if started:
+                raise
+            await JSONResponse({"detail": "Request timed out"},
+                               status_code=status.HTTP_504_GATEWAY_TIMEOUT)(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
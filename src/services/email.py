@@ -1,3 +1,4 @@
+import logging
 from pathlib import Path
 
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
@@ -5,8 +6,11 @@ from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
+from src.services.logs import mask_email
 from src.conf.config import settings
 
+logger = logging.getLogger(__name__)
+
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
     MAIL_PASSWORD=settings.mail_password,
@@ -19,6 +23,7 @@ conf = ConnectionConfig(
     USE_CREDENTIALS=True,
     VALIDATE_CERTS=True,
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+    TIMEOUT=settings.mail_timeout,
 )
 
 
@@ -48,4 +53,25 @@ async def send_email(email: EmailStr, username: str, host: str):
         fm = FastMail(conf)
         await fm.send_message(message, template_name="email_template.html")
     except ConnectionErrors as err:
-        print(err)
+        logger.error("Could not send confirmation email to %s: %s", mask_email(email), err)
+
+
+async def send_birthday_reminder(email: EmailStr, username: str, contacts: list[dict]):
+    """
+    The send_birthday_reminder function sends the user a list of their contacts with upcoming birthdays.
+
+    :param email: EmailStr: The address of the user
+    :param username: str: Pass the username to the email template
+    :param contacts: list[dict]: The contacts with upcoming birthdays
+    :return: A coroutine object
+    :doc-author: Trelent
+    """
+    message = MessageSchema(
+        subject="Upcoming birthdays",
+        recipients=[email],
+        template_body={"username": username, "contacts": contacts},
+        subtype=MessageType.html
+    )
+
+    fm = FastMail(conf)
+    await fm.send_message(message, template_name="birthday_template.html")
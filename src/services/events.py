@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect import pubsub_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "contacts:"
+
+
+async def publish_contact_event(user_id: int, event: str, contact_id: int) -> None:
+    """
+    The publish_contact_event function announces a change of a contact on the user's Redis channel.
+        Events are notifications only: a client that misses one catches up through /contacts/changes,
+        so a Redis outage is logged and never fails the write that triggered the event.
+
+    :param user_id: int: The owner of the contact
+    :param event: str: created, updated or deleted
+    :param contact_id: int: The id of the changed contact
+    :return: None
+    :doc-author: Trelent
+    """
+    payload = json.dumps({"event": event, "contact_id": contact_id, "ts": time.time()})
+    try:
+        await redis_client.publish(f"{CHANNEL_PREFIX}{user_id}", payload)
+    except RedisError as err:
+        logger.warning("Could not publish contact event: %s", err)
+
+
+class Subscription:
+    def __init__(self, user_id: int, size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=size)
+
+
+class ContactEventHub:
+    """
+    Fans contact events out to the streaming connections of this worker.
+
+    The worker holds a single Redis pub/sub connection however many clients are connected. Every subscription has
+    a bounded queue; a client that falls behind by more than its queue size is dropped (it receives None) instead of
+    letting the backlog grow, and is expected to reconnect and resync through /contacts/changes.
+    """
+
+    def __init__(self, r: Redis, queue_size: int):
+        self.r = r
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self._task: asyncio.Task | None = None
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """
+        The subscribe function registers a new connection of the user and starts the Redis listener if needed.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user whose events the connection receives
+        :return: The subscription with the queue to read events from
+        :doc-author: Trelent
+        """
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscriptions[user_id].add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, user_id: int, data: str) -> None:
+        """
+        The dispatch function hands an event to every local subscription of the user without waiting on any of them.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user the event belongs to
+        :param data: str: The event payload
+        :return: None
+        :doc-author: Trelent
+        """
+        for subscription in list(self._subscriptions.get(user_id, ())):
+            try:
+                subscription.queue.put_nowait(data)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self.unsubscribe(subscription)
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    async def _listen(self) -> None:
+        while self._subscriptions:
+            try:
+                async with self.r.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        try:
+                            user_id = int(message["channel"][len(CHANNEL_PREFIX):])
+                        except ValueError:
+                            # someone else's channel that matches the pattern; it must not stop the listener
+                            logger.warning("Ignored message on channel %s", message["channel"])
+                            continue
+                        self.dispatch(user_id, message["data"])
+            except RedisError as err:
+                logger.warning("Contact event listener lost Redis: %s", err)
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+contact_events = ContactEventHub(pubsub_client, settings.sse_queue_size)
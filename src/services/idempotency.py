@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, status
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.connect import redis_client
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+
+
+class IdempotencyStore:
+    """
+    Remembers the response of a write made with an Idempotency-Key header, so a retried request gets the same
+    response instead of repeating the write.
+
+    The first request claims the key with a short-lived pending marker (SET NX) and replaces it with the response
+    once the handler has finished. Requests arriving while the marker is set wait for the response; if the handler
+    fails the marker is removed, so the client can retry. Keys are scoped per user, and a key reused with a
+    different request body is rejected.
+    """
+
+    def __init__(self, r: Redis, ttl: int, lock_ttl: float, wait: float):
+        self.r = r
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+
+    @staticmethod
+    def _key(scope: str, key: str) -> str:
+        return f"idempotency:{scope}:{key}"
+
+    async def execute(self, scope: str, key: str, fingerprint: str,
+                      handler: Callable[[], Awaitable[tuple[int, str]]]) -> tuple[int, str, bool]:
+        """
+        The execute function runs handler once per idempotency key and returns its stored response on replays.
+            If Redis is unavailable the handler is run without protection.
+
+        :param self: Represent the instance of the class
+        :param scope: str: The namespace of the key, e.g. the user and the route
+        :param key: str: The Idempotency-Key sent by the client
+        :param fingerprint: str: A digest of the request body
+        :param handler: Callable[[], Awaitable[tuple[int, str]]]: Perform the write and return status code and JSON body
+        :return: The status code, the JSON body and whether the response is a replay
+        :doc-author: Trelent
+        """
+        redis_key = self._key(scope, key)
+        try:
+            stored = await self._claim_or_wait(redis_key, fingerprint)
+        except RedisError as err:
+            logger.warning("Idempotency store unavailable: %s", err)
+            metrics.inc("idempotency_errors")
+            return *(await handler()), False
+
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    detail="Idempotency-Key was already used with a different request")
+            metrics.inc("idempotency_replays")
+            return stored["status"], stored["body"], True
+
+        try:
+            status_code, body = await handler()
+        except BaseException:
+            await self._forget(redis_key)
+            raise
+        try:
+            await self.r.set(redis_key, json.dumps({"fingerprint": fingerprint, "status": status_code, "body": body}),
+                             ex=self.ttl)
+        except RedisError as err:
+            logger.warning("Could not store idempotent response: %s", err)
+            metrics.inc("idempotency_errors")
+        return status_code, body, False
+
+    async def _claim_or_wait(self, redis_key: str, fingerprint: str) -> dict | None:
+        marker = json.dumps({"fingerprint": fingerprint, "status": PENDING})
+        deadline = time.monotonic() + self.wait
+        waited = False
+        while True:
+            if await self.r.set(redis_key, marker, nx=True, px=int(self.lock_ttl * 1000)):
+                return None
+            stored = await self.r.get(redis_key)
+            if stored is not None:
+                stored = json.loads(stored)
+                if stored["status"] != PENDING:
+                    return stored
+                if stored["fingerprint"] != fingerprint:
+                    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                        detail="Idempotency-Key was already used with a different request")
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="A request with this Idempotency-Key is still in progress")
+            if not waited:
+                metrics.inc("idempotency_waits")
+                waited = True
+            await asyncio.sleep(0.05)
+
+    async def _forget(self, redis_key: str) -> None:
+        try:
+            await self.r.delete(redis_key)
+        except RedisError:
+            pass
+
+
+idempotency = IdempotencyStore(redis_client, settings.idempotency_ttl, settings.idempotency_lock_ttl,
+                               settings.idempotency_wait)
@@ -0,0 +1,156 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import JWTError, jwk, jwt
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def exclusive_lock(path: Path):
+    """
+    The exclusive_lock function holds an exclusive flock on path for the duration of the with block.
+        Without fcntl (Windows) nothing is locked: workers starting together may then generate a key each,
+        and pick up each other's keys through the reload on an unknown kid.
+
+    :param path: Path: The lock file, created if missing
+    :return: A context manager
+    :doc-author: Trelent
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+class KeyRing:
+    """
+    In-memory set of JWT signing keys.
+
+    For RS* algorithms every ``<kid>.pem`` private key in ``keys_dir`` is loaded. The active key (``active_kid`` or
+    the last kid in sort order) signs new tokens and puts its kid into the token header; every other key is kept
+    for verification only, so a key can be rotated by dropping a new file next to the old one and removed once the
+    tokens it signed have expired. The public halves are published as a JWKS document.
+
+    For HS* algorithms the shared secret is used as before and nothing is published.
+    """
+    RELOAD_INTERVAL = 30
+
+    def __init__(self, algorithm: str, secret: str, keys_dir: str, active_kid: str | None = None):
+        self.algorithm = algorithm
+        self.secret = secret
+        self.keys_dir = Path(keys_dir)
+        self.active_kid = active_kid
+        self._private_keys: dict[str, str] = {}
+        self._public_keys: dict[str, jwk.Key] = {}
+        self._jwks: dict = {"keys": []}
+        self._loaded_at = None
+
+    @property
+    def is_asymmetric(self) -> bool:
+        return not self.algorithm.startswith("HS")
+
+    def load(self) -> None:
+        """
+        The load function (re)reads the private keys from keys_dir and rebuilds the public key ring and JWKS.
+        If the directory holds no keys yet, one is generated so that a fresh checkout can issue tokens.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.keys_dir.mkdir(parents=True, exist_ok=True)
+        paths = sorted(self.keys_dir.glob("*.pem"))
+        if not paths:
+            self._generate_key()
+            paths = sorted(self.keys_dir.glob("*.pem"))
+        private_keys, public_keys = {}, {}
+        for path in paths:
+            pem = path.read_text()
+            private_keys[path.stem] = pem
+            public_keys[path.stem] = jwk.construct(pem, self.algorithm).public_key()
+        self._private_keys, self._public_keys = private_keys, public_keys
+        self._jwks = {"keys": [{**key.to_dict(), "kid": kid, "use": "sig"} for kid, key in public_keys.items()]}
+        self._loaded_at = time.monotonic()
+
+    def _generate_key(self) -> None:
+        # Workers starting together all find the directory empty: the first to take the lock generates the key,
+        # the others find it once they get the lock, so every worker signs with the same kid.
+        with exclusive_lock(self.keys_dir / ".lock"):
+            if any(self.keys_dir.glob("*.pem")):
+                return
+            kid = time.strftime("%Y%m%d%H%M%S")
+            key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+            # written under another name first, so a reload never reads half a key, and readable by the owner only
+            partial = self.keys_dir / f"{kid}.pem.partial"
+            partial.unlink(missing_ok=True)
+            with os.fdopen(os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as file:
+                file.write(pem)
+            os.replace(partial, self.keys_dir / f"{kid}.pem")
+            logger.warning("Generated JWT signing key %s", self.keys_dir / f"{kid}.pem")
+
+    def encode(self, claims: dict) -> str:
+        """
+        The encode function signs the claims with the active key.
+
+        :param self: Represent the instance of the class
+        :param claims: dict: The claims to encode
+        :return: A signed jwt
+        :doc-author: Trelent
+        """
+        if not self.is_asymmetric:
+            return jwt.encode(claims, self.secret, algorithm=self.algorithm)
+        if self._loaded_at is None:
+            self.load()
+        kid = self.active_kid if self.active_kid in self._private_keys else max(self._private_keys)
+        return jwt.encode(claims, self._private_keys[kid], algorithm=self.algorithm, headers={"kid": kid})
+
+    def decode(self, token: str) -> dict:
+        """
+        The decode function verifies the token with the key named by its kid header.
+        An unknown kid triggers at most one reload per RELOAD_INTERVAL, so keys added by a rotation are picked up
+        without a restart.
+
+        :param self: Represent the instance of the class
+        :param token: str: The jwt to verify
+        :return: The claims of the token
+        :doc-author: Trelent
+        """
+        if not self.is_asymmetric:
+            return jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        kid = jwt.get_unverified_header(token).get("kid")
+        if self._loaded_at is None or \
+                kid not in self._public_keys and time.monotonic() - self._loaded_at > self.RELOAD_INTERVAL:
+            self.load()
+        key = self._public_keys.get(kid)
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, key, algorithms=[self.algorithm])
+
+    def jwks(self) -> dict:
+        """
+        The jwks function returns the public keys as a JSON Web Key Set.
+
+        :param self: Represent the instance of the class
+        :return: The JWKS document
+        :doc-author: Trelent
+        """
+        if self.is_asymmetric and self._loaded_at is None:
+            self.load()
+        return self._jwks
+
+
+key_ring = KeyRing(settings.algorithm, settings.secret_key_jwt, settings.jwt_keys_dir, settings.jwt_active_kid)
@@ -0,0 +1,240 @@
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+
+# The fields of the request being served. It is one dict per request, set by AccessLogMiddleware; code that runs in
+# copies of the context (sync endpoints in the thread pool) updates the same dict.
+request_log: ContextVar[dict | None] = ContextVar("request_log", default=None)
+
+# The scope of that request: FastAPI sets its route once the request is routed.
+request_scope: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+
+access_logger = logging.getLogger("access")
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON object.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def bind(**fields) -> None:
+    """
+    The bind function adds fields to the logs of the current request, e.g. the id of the authenticated user.
+
+    :param fields: The fields to add
+    :return: None
+    :doc-author: Trelent
+    """
+    current = request_log.get()
+    if current is not None:
+        current.update(fields)
+
+
+def route_of(scope: Scope | None) -> str | None:
+    route = scope and scope.get("route")
+    return getattr(route, "path", None)
+
+
+def mask_email(email: str) -> str:
+    """
+    The mask_email function hides an email address for logs, keeping the first character and the domain:
+        s.nester@gmail.com becomes s***@gmail.com.
+
+    :param email: str: The email address
+    :return: The masked address
+    :doc-author: Trelent
+    """
+    local, _, domain = str(email).rpartition("@")
+    if not local:
+        return "***"
+    return f"{local[0]}***@{domain}"
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    # kept on the execution context, which is discarded with the statement even when it raises
+    if request_log.get() is not None and context is not None:
+        context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    """
+    The after_cursor_execute function adds the time a statement took to the db_time of the current request.
+        It is registered on the engines together with before_cursor_execute.
+
+    :param conn: Connection: The connection that ran the statement
+    :param context: ExecutionContext: The context before_cursor_execute stored the start time on
+    :return: None
+    :doc-author: Trelent
+    """
+    current = request_log.get()
+    started = getattr(context, "query_started", None)
+    if current is not None and started is not None:
+        current["db_time"] = current.get("db_time", 0.0) + time.perf_counter() - started
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the fields of the current request onto the record while still in the request, since the record is
+    formatted later in the listener thread, where the request is unknown. Records below WARNING are kept with
+    probability sample_rate, which is noted on the records kept.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sample_rate < 1.0:
+            if random.random() >= self.sample_rate:
+                return False
+            record.sample_rate = self.sample_rate
+        current = request_log.get()
+        if current is not None:
+            for key, value in current.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+            if not hasattr(record, "route"):
+                record.route = route_of(request_scope.get())
+        return True
+
+
+class JsonQueueHandler(QueueHandler):
+    """
+    Puts records on the queue with only the message merged and the traceback rendered to text; JSON encoding and
+    writing are left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line: time, level, logger and message, the request fields
+    and whatever was passed with extra=.
+    """
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+                 "level": record.levelname, "logger": record.name, "message": record.getMessage()}
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LogPipeline:
+    """
+    Sends the records of the root logger through a queue to a QueueListener thread that formats them as JSON and
+    writes them, so the request path neither formats nor blocks on I/O.
+    """
+
+    def __init__(self, level: str, sample_rate: float, stream=None):
+        self.level = level
+        self.sample_rate = sample_rate
+        self.stream = stream
+        self._handler: JsonQueueHandler | None = None
+        self._listener: QueueListener | None = None
+        self._replaced: list[logging.Handler] = []
+
+    def start(self) -> None:
+        """
+        The start function replaces the handlers of the root logger with the queue and starts the listener;
+        close puts the handlers back.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._listener is not None:
+            return
+        records = queue.SimpleQueue()
+        output = logging.StreamHandler(self.stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self._handler = JsonQueueHandler(records)
+        self._handler.addFilter(ContextFilter(self.sample_rate))
+        root = logging.getLogger()
+        self._replaced = root.handlers[:]
+        for handler in self._replaced:
+            root.removeHandler(handler)
+        root.addHandler(self._handler)
+        root.setLevel(self.level)
+        self._listener = QueueListener(records, output)
+        self._listener.start()
+
+    def close(self) -> None:
+        if self._listener is not None:
+            root = logging.getLogger()
+            root.removeHandler(self._handler)
+            for handler in self._replaced:
+                root.addHandler(handler)
+            self._listener.stop()
+            self._listener = None
+
+
+class AccessLogMiddleware:
+    """
+    Logs every HTTP request as one access record with its request id, route, status, latency and the time spent in
+    database statements, and makes these fields available to all logs written while serving it.
+
+    The request id is taken from the X-Request-ID header when the client sends one and returned in the response.
+    Server errors are logged at ERROR and so are never sampled away.
+    """
+
+    def __init__(self, app: ASGIApp, header: str = "X-Request-ID"):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = next((value.decode("latin-1")[:128] for name, value in scope["headers"] if name == self.header),
+                          None) or uuid4().hex
+        fields = {"request_id": request_id, "method": scope["method"], "path": scope["path"]}
+        token = request_log.set(fields)
+        scope_token = request_scope.set(scope)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), (self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            fields["route"] = route_of(scope)
+            fields["db_time"] = round(fields.get("db_time", 0.0), 6)
+            access_logger.log(logging.ERROR if status_code >= 500 else logging.INFO, "%s %s %s",
+                              scope["method"], scope["path"], status_code,
+                              extra={"status": status_code, "latency": round(time.perf_counter() - start, 6)})
+            request_log.reset(token)
+            request_scope.reset(scope_token)
+
+
+log_pipeline = LogPipeline(settings.log_level, settings.log_info_sample_rate)
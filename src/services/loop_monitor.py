@@ -0,0 +1,44 @@
+import asyncio
+
+from src.conf.config import settings
+from src.services.metrics import metrics
+
+
+class LoopMonitor:
+    """
+    Measures the lag of this worker's event loop: how late a timer that should fire every interval seconds runs.
+
+    The lag grows when callbacks hog the loop, synchronous database calls included, or when more work is ready than
+    the loop gets through. The reported value follows a rise at once and decays over a few intervals, so a single
+    quiet tick does not hide a loop that is struggling.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lag = lag if lag > self.lag else self.lag * 0.8 + lag * 0.2
+            metrics.observe("event_loop_lag", lag)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_monitor = LoopMonitor(settings.loop_monitor_interval)
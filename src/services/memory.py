@@ -0,0 +1,163 @@
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.conf.config import settings
+
+
+class MemoryTracker:
+    """
+    Starts and stops tracemalloc in this worker and keeps the last snapshots taken, so the allocation sites that
+    grow between two of them can be compared.
+
+    While tracing, MemoryMiddleware reports per route the memory a request left allocated when it finished and, for
+    requests that ran alone, the peak it allocated on top of what was allocated when it started.
+    """
+
+    def __init__(self, max_snapshots: int):
+        self.max_snapshots = max_snapshots
+        self.snapshots: OrderedDict[int, tuple[float, tracemalloc.Snapshot]] = OrderedDict()
+        self.routes: dict[str, dict[str, float]] = {}
+        self.in_flight = 0
+        self.requests_started = 0
+        self._next_id = 1
+        # tracemalloc's own bookkeeping and imports would otherwise show up among the top sites
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                         tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                         tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                         tracemalloc.Filter(False, "<unknown>")]
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int) -> None:
+        if not self.running:
+            self.routes.clear()
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": self.running, "frames": tracemalloc.get_traceback_limit(), "traced_bytes": current,
+                "peak_bytes": peak, "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+                "snapshots": [{"id": snapshot_id, "at": at} for snapshot_id, (at, _) in self.snapshots.items()],
+                "routes": self.report_routes()}
+
+    def take_snapshot(self) -> int:
+        """
+        The take_snapshot function takes a snapshot of the traced allocations and keeps it under a new id,
+        dropping the oldest snapshot once there are more than max_snapshots.
+
+        :param self: Represent the instance of the class
+        :return: The id of the snapshot
+        :doc-author: Trelent
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+        snapshot_id, self._next_id = self._next_id, self._next_id + 1
+        self.snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+        return snapshot_id
+
+    def top(self, snapshot_id: int, key_type: str = "lineno", limit: int = 20) -> list[dict] | None:
+        """
+        The top function returns the allocation sites of a snapshot that hold the most memory.
+
+        :param self: Represent the instance of the class
+        :param snapshot_id: int: The id of the snapshot
+        :param key_type: str: Group by lineno, filename or traceback
+        :param limit: int: The number of sites
+        :return: The sites with their size and number of blocks, or None if the snapshot is unknown
+        :doc-author: Trelent
+        """
+        if snapshot_id not in self.snapshots:
+            return None
+        _, snapshot = self.snapshots[snapshot_id]
+        return [{"site": self._site(stat.traceback, key_type), "size": stat.size, "count": stat.count}
+                for stat in snapshot.statistics(key_type)[:limit]]
+
+    def diff(self, first: int, second: int, key_type: str = "lineno", limit: int = 20) -> list[dict] | None:
+        """
+        The diff function compares two snapshots and returns the allocation sites that grew or shrank the most
+        from the first to the second.
+
+        :param self: Represent the instance of the class
+        :param first: int: The id of the older snapshot
+        :param second: int: The id of the newer snapshot
+        :param key_type: str: Group by lineno, filename or traceback
+        :param limit: int: The number of sites
+        :return: The sites with their size, count and the differences, or None if a snapshot is unknown
+        :doc-author: Trelent
+        """
+        if first not in self.snapshots or second not in self.snapshots:
+            return None
+        stats = self.snapshots[second][1].compare_to(self.snapshots[first][1], key_type)
+        return [{"site": self._site(stat.traceback, key_type), "size": stat.size, "size_diff": stat.size_diff,
+                 "count": stat.count, "count_diff": stat.count_diff}
+                for stat in stats[:limit]]
+
+    @staticmethod
+    def _site(traceback: tracemalloc.Traceback, key_type: str) -> str | list[str]:
+        if key_type == "traceback":
+            return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+        frame = traceback[0]
+        return frame.filename if key_type == "filename" else f"{frame.filename}:{frame.lineno}"
+
+    def record(self, route: str, retained: int, peak: int | None) -> None:
+        stats = self.routes.setdefault(route, {"count": 0, "retained": 0, "peak_samples": 0, "peak_max": 0})
+        stats["count"] += 1
+        stats["retained"] += retained
+        if peak is not None:
+            stats["peak_samples"] += 1
+            stats["peak_max"] = max(stats["peak_max"], peak)
+
+    def report_routes(self) -> dict:
+        routes = sorted(self.routes.items(), key=lambda item: item[1]["peak_max"], reverse=True)
+        return {route: {"count": stats["count"], "retained_bytes": stats["retained"],
+                        "peak_samples": stats["peak_samples"], "peak_max_bytes": stats["peak_max"]}
+                for route, stats in routes}
+
+
+class MemoryMiddleware:
+    """
+    Attributes the memory traced by tracemalloc to routes; does nothing while tracemalloc is not tracing.
+
+    tracemalloc has a single peak for the whole process, so the peak of a request is only recorded when no other
+    request ran at the same time. The memory retained by a request is recorded for all of them and, with
+    concurrent requests, is only meaningful summed over many.
+    """
+
+    def __init__(self, app: ASGIApp, tracker: MemoryTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+        tracker = self.tracker
+        tracker.requests_started += 1
+        ticket = tracker.requests_started
+        alone = tracker.in_flight == 0
+        tracker.in_flight += 1
+        if alone:
+            tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tracker.in_flight -= 1
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                alone = alone and tracker.requests_started == ticket
+                route = scope.get("route")
+                tracker.record(f"{scope['method']} {getattr(route, 'path', scope['path'])}", current - start,
+                               peak - start if alone else None)
+
+
+memory_tracker = MemoryTracker(settings.memory_snapshots)
@@ -0,0 +1,46 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    Process-local counters and summaries, read by the /metrics endpoint.
+
+    Every worker keeps its own numbers; aggregate across workers in whatever scrapes them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._summaries: dict[str, dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        The observe function records one sample of a summary (count, sum and max).
+
+        :param self: Represent the instance of the class
+        :param name: str: The name of the summary
+        :param value: float: The sample
+        :return: None
+        :doc-author: Trelent
+        """
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"counters": dict(self._counters),
+                    "summaries": {name: dict(summary) for name, summary in self._summaries.items()}}
+
+
+metrics = Metrics()
@@ -0,0 +1,43 @@
+import re
+
+from src.conf.config import settings
+
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: str | None, country_code: str = settings.phone_country_code) -> str | None:
+    """
+    The normalize_phone function converts a free-form phone number to E.164 (+ and up to 15 digits).
+        Numbers written with + or 00 keep their country code, numbers with a national trunk 0 get country_code.
+        Anything else is assumed to already start with a country code.
+
+    :param phone: str | None: The phone number as entered
+    :param country_code: str: The country code of numbers written in national format
+    :return: The E.164 number, or None if it cannot be one
+    :doc-author: Trelent
+    """
+    if not phone:
+        return None
+    digits = NON_DIGITS.sub("", phone)
+    if phone.lstrip().startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+    The normalize_email function lower-cases an email address and strips surrounding whitespace.
+
+    :param email: str | None: The email address as entered
+    :return: The normalized address, or None if it is empty
+    :doc-author: Trelent
+    """
+    if not email or not email.strip():
+        return None
+    return email.strip().lower()
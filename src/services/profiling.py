@@ -0,0 +1,119 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl
+from uuid import uuid4
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+
+class ProfileStore:
+    """
+    The last profiles taken by this worker, newest last. Old ones are dropped once there are more than max_entries.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._profiles: OrderedDict[str, dict] = OrderedDict()
+
+    def add(self, profile_id: str, profile: cProfile.Profile, **info) -> None:
+        self._profiles[profile_id] = {"id": profile_id, **info, "stats": pstats.Stats(profile)}
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+
+    def list(self) -> list[dict]:
+        return [{key: value for key, value in entry.items() if key != "stats"}
+                for entry in reversed(self._profiles.values())]
+
+    def get(self, profile_id: str) -> pstats.Stats | None:
+        entry = self._profiles.get(profile_id)
+        return entry and entry["stats"]
+
+    def dump(self, profile_id: str) -> bytes | None:
+        """
+        The dump function returns a profile in the format of pstats.Stats.dump_stats, readable by pstats,
+        snakeviz or gprof2dot.
+
+        :param self: Represent the instance of the class
+        :param profile_id: str: The id of the profile
+        :return: The profile or None if it is unknown
+        :doc-author: Trelent
+        """
+        stats = self.get(profile_id)
+        return None if stats is None else marshal.dumps(stats.stats)
+
+    def text(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> str | None:
+        stats = self.get(profile_id)
+        if stats is None:
+            return None
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Runs cProfile around a single request when an admin asks for it with the X-Profile header or the profile query
+    parameter, and stores the result in a ProfileStore. The profiled response carries its id in X-Profile-Id.
+
+    Other requests pay for one header lookup and nothing else. The token is checked only when the flag is present,
+    and without a database query. One request is profiled at a time: cProfile profiles the whole loop thread, so
+    while it runs it also sees other requests awaiting on the same loop, and it does not see sync endpoints, which
+    run in the thread pool.
+    """
+
+    def __init__(self, app: ASGIApp, store: ProfileStore, header: str = "X-Profile", parameter: str = "profile"):
+        self.app = app
+        self.store = store
+        self.header = header.lower().encode("latin-1")
+        self.parameter = parameter
+        self._lock = threading.Lock()
+
+    def requested(self, scope: Scope) -> bool:
+        headers = scope["headers"]
+        query = scope["query_string"]
+        flagged = any(name == self.header for name, _ in headers) or \
+            self.parameter.encode() in query and self.parameter in dict(parse_qsl(query.decode("latin-1")))
+        if not flagged:
+            return False
+        authorization = next((value for name, value in headers if name == b"authorization"), b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        return scheme.lower() == "bearer" and auth_service.admin_from_token(token) is not None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.requested(scope) or not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        profile_id = uuid4().hex
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profile.disable()
+        finally:
+            self._lock.release()
+            self.store.add(profile_id, profile, method=scope["method"], path=scope["path"],
+                           status=status_code, at=time.time(), seconds=round(time.perf_counter() - started, 4))
+
+
+profile_store = ProfileStore(settings.profile_history)
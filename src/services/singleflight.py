@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from src.services.metrics import metrics
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution within this worker.
+
+    The first caller (the leader) runs the function inline, so it keeps using its own request's resources; callers
+    arriving while it runs wait for the leader's result or exception. If the leader is cancelled (its client went
+    away) the waiting callers retry and one of them becomes the new leader.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        The do function returns the result of fn, sharing it with every concurrent call made with the same key.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Identify calls that are interchangeable
+        :param fn: Callable[[], Awaitable[Any]]: The work to run once
+        :return: The result of fn
+        :doc-author: Trelent
+        """
+        while key in self._calls:
+            future = self._calls[key]
+            metrics.inc(f"singleflight_{self.name}_collapsed")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        metrics.inc(f"singleflight_{self.name}_executed")
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as err:
+            future.set_exception(err)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database.lazy import LazySession
+from src.database.models import Base, User
+
+
+class TestLazySession(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.engine = create_engine(f"sqlite:///{os.path.join(directory.name, 'lazy.db')}")
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        with Session(self.engine) as db:
+            db.add(User(email="lazy@example.com", password="secret"))
+            db.commit()
+        self.db = LazySession(sessionmaker(bind=self.engine, expire_on_commit=False))
+        self.addCleanup(self.db.close)
+
+    def find(self):
+        return self.db.scalars(select(User).where(User.email == "lazy@example.com")).first()
+
+    async def test_session_is_created_on_first_use(self):
+        factory = MagicMock(side_effect=sessionmaker(bind=self.engine))
+        db = LazySession(factory)
+        db.close()
+        factory.assert_not_called()
+        db.query(User)
+        factory.assert_called_once()
+        db.close()
+
+    async def test_read_releases_connection(self):
+        user = self.find()
+        self.assertEqual(self.engine.pool.checkedout(), 1)
+        await asyncio.sleep(0)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+        self.assertEqual(user.email, "lazy@example.com")
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+    async def test_pending_changes_keep_connection(self):
+        user = self.find()
+        user.username = "changed"
+        await asyncio.sleep(0)
+        self.assertEqual(self.engine.pool.checkedout(), 1)
+        self.db.commit()
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+    async def test_explicit_connection_keeps_transaction(self):
+        self.db.connection()
+        self.find()
+        await asyncio.sleep(0)
+        self.assertTrue(self.db.in_transaction())
+        self.db.rollback()
+        self.find()
+        await asyncio.sleep(0)
+        self.assertFalse(self.db.in_transaction())
+
+    async def test_failed_release_hands_connection_back(self):
+        self.find()
+        with patch.object(self.db.session, "commit", side_effect=RuntimeError("lost connection")), \
+                self.assertLogs("src.database.lazy", "ERROR"):
+            await asyncio.sleep(0)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+        self.assertFalse(self.db.in_transaction())
+        self.assertEqual(self.find().email, "lazy@example.com")
+
+    async def test_failed_rollback_closes_session(self):
+        self.find()
+        with patch.object(self.db.session, "commit", side_effect=RuntimeError("lost connection")), \
+                patch.object(self.db.session, "rollback", side_effect=RuntimeError("lost connection")), \
+                self.assertLogs("src.database.lazy", "ERROR"):
+            await asyncio.sleep(0)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
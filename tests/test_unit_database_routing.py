@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, select
+
+from src.database.models import Base, User
+from src.database.routing import ReplicaSet, RoutingSession, session_user
+
+
+class TestRoutingSession(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.primary = create_engine(f"sqlite:///{os.path.join(directory.name, 'primary.db')}")
+        self.replica = create_engine(f"sqlite:///{os.path.join(directory.name, 'replica.db')}")
+        for engine in (self.primary, self.replica):
+            Base.metadata.create_all(engine)
+            self.addCleanup(engine.dispose)
+        # The replica lags behind: it does not have the user yet.
+        with RoutingSession(bind=self.primary) as db:
+            db.add(User(email="lag@example.com", password="secret"))
+            db.commit()
+        self.replicas = ReplicaSet(self.primary, [self.replica], sticky_for=60, eject_for=60)
+        token = session_user.set(None)
+        self.addCleanup(session_user.reset, token)
+
+    def session(self):
+        return RoutingSession(replica_set=self.replicas, bind=self.primary)
+
+    def find(self, db, email="lag@example.com"):
+        return db.scalars(select(User).where(User.email == email)).first()
+
+    def test_reads_go_to_replica(self):
+        with self.session() as db:
+            self.assertIsNone(self.find(db))
+            self.assertIs(db.get_bind(clause=select(User)), self.replica)
+
+    def test_session_stays_on_primary_after_write(self):
+        with self.session() as db:
+            db.add(User(email="new@example.com", password="secret"))
+            db.commit()
+            self.assertIsNotNone(self.find(db, "new@example.com"))
+            self.assertIsNotNone(self.find(db))
+
+    def test_read_your_writes_for_user(self):
+        session_user.set("writer@example.com")
+        with self.session() as db:
+            db.add(User(email="writer@example.com", password="secret"))
+            db.commit()
+        with self.session() as db:
+            self.assertIsNotNone(self.find(db, "writer@example.com"))
+        session_user.set("other@example.com")
+        with self.session() as db:
+            self.assertIsNone(self.find(db, "writer@example.com"))
+
+    def test_broken_replica_is_ejected(self):
+        broken = create_engine("sqlite:////nonexistent/dir/replica.db")
+        replicas = ReplicaSet(self.primary, [broken], sticky_for=60, eject_for=60)
+        with RoutingSession(replica_set=replicas, bind=self.primary) as db:
+            with self.assertRaises(Exception):
+                self.find(db)
+        self.assertIs(replicas.replica(), self.primary)
+        with RoutingSession(replica_set=replicas, bind=self.primary) as db:
+            self.assertIsNotNone(self.find(db))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import unittest
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.orm import Session
+
+from src.database.models import Contact
+from src.jobs.birthday_digest import build_digest
+
+
+class TestBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.day = date(2024, 1, 1)
+        self.contact = Contact(id=5, name="Jane", surname="Doe", email="jane@example.com", phone_number="123",
+                               date_of_birth=date(2024, 1, 3), description="friend")
+
+        async def by_user(day, db, batch_size):
+            yield SimpleNamespace(id=1, username="a", email="a@example.com"), [self.contact]
+            yield SimpleNamespace(id=2, username="b", email="b@example.com"), []
+
+        patcher = patch("src.jobs.birthday_digest.repository_contacts.upcoming_birthdays_by_user", by_user)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        digest = patch("src.jobs.birthday_digest.birthday_digest")
+        self.digest = digest.start()
+        self.addCleanup(digest.stop)
+        for method in ("start", "add", "publish"):
+            setattr(self.digest, method, AsyncMock())
+        sender = patch("src.jobs.birthday_digest.send_birthday_reminder", new_callable=AsyncMock)
+        self.send = sender.start()
+        self.addCleanup(sender.stop)
+
+    async def test_build_digest(self):
+        stats = await build_digest(self.day, self.session)
+
+        self.assertEqual(stats, {"users": 2, "with_birthdays": 1, "failed_emails": 0})
+        stored = self.digest.add.call_args_list[0].args[1]
+        self.assertEqual(json.loads(stored[1])[0]["id"], 5)
+        self.assertEqual(stored[2], "[]")
+        self.digest.publish.assert_awaited_once_with(self.day)
+        self.send.assert_not_called()
+
+    async def test_reminders(self):
+        self.send.side_effect = [None]
+        stats = await build_digest(self.day, self.session, reminders=True, batch_size=1)
+
+        self.assertEqual(stats["failed_emails"], 0)
+        self.send.assert_awaited_once()
+        self.assertEqual(self.send.call_args.args[0], "a@example.com")
+        self.assertEqual(self.digest.add.await_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,20 +1,29 @@
 import unittest
 from datetime import datetime, timedelta, date
-from unittest.mock import MagicMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 
 from sqlalchemy.orm import Session
 
-from src.database.models import User, Contact
+from src.database.models import User, Contact, ContactTombstone
 from src.schema import ContactModel
 from src.repository.contacts import (
     get_contacts,
     get_contact,
+    get_contacts_by_ids,
+    get_changes,
+    prune_tombstones,
     create_contact,
     remove_contact,
     upcoming_birthdays,
+    upcoming_birthdays_by_user,
     read_contacts,
-    update_contact
+    lookup_contacts,
+    suggest_contacts,
+    find_duplicates,
+    update_contact,
+    user_contacts,
 )
 
 
@@ -22,27 +31,51 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
         self.session = MagicMock(spec=Session)
+        self.session.info = {}
         self.user = User(id=1)
+        publisher = patch("src.repository.contacts.publish_contact_event", new_callable=AsyncMock)
+        self.publish = publisher.start()
+        self.addCleanup(publisher.stop)
+        invalidator = patch("src.repository.contacts.contacts_cache.invalidate", new_callable=AsyncMock)
+        self.invalidate = invalidator.start()
+        self.addCleanup(invalidator.stop)
+        digest = patch("src.repository.contacts.birthday_digest.invalidate", new_callable=AsyncMock)
+        self.invalidate_digest = digest.start()
+        self.addCleanup(digest.stop)
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().all.return_value = contacts
+        self.session.scalars().all.return_value = contacts
         result = await get_contacts(user=self.user, db=self.session)
         self.assertEqual(len(result), len(contacts))
         for contact in result:
             self.assertIsInstance(contact, Contact)
 
+    async def test_get_contacts_fields(self):
+        contacts = [Contact(id=1, name="John", surname="Doe")]
+        self.session.scalars().all.return_value = contacts
+        result = await get_contacts(user=self.user, db=self.session, fields=("id", "name", "surname"))
+        self.assertEqual(result, contacts)
+        self.session.scalars.assert_called_with(user_contacts(("id", "name", "surname")), {"user_id": self.user.id})
+        self.assertIs(user_contacts(("id", "name", "surname")), user_contacts(("id", "name", "surname")))
+
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.scalars().first.return_value = contact
         result = await get_contact(user=self.user, contact_id=1, db=self.session)
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalars().first.return_value = None
         result = await get_contact(user=self.user, contact_id=1,  db=self.session)
         self.assertIsNone(result)
 
+    async def test_get_contacts_by_ids(self):
+        contacts = [Contact(id=1), Contact(id=3)]
+        self.session.scalars().all.return_value = contacts
+        result = await get_contacts_by_ids(user=self.user, contact_ids=[1, 2, 3], db=self.session)
+        self.assertEqual(result, contacts)
+
     async def test_create_contact(self):
         body = ContactModel(name="Serg", surname="Testovich", email="s.nester@gmail.com", phone_number='+380732044873',
                             date_of_birth=date(1986, 1, 12), description="test contact")
@@ -54,22 +87,64 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.date_of_birth, body.date_of_birth)
         self.assertEqual(result.description, body.description)
         self.assertTrue(hasattr(result, "id"))
+        self.publish.assert_awaited_once_with(self.user.id, "created", result.id)
+        self.invalidate.assert_awaited_once_with(self.user.id)
+
+    async def test_get_changes(self):
+        contacts = [Contact(id=1)]
+        tombstones = [ContactTombstone(contact_id=2)]
+        now = datetime(2023, 1, 2)
+        self.session.scalar.return_value = now
+        self.session.scalars().all.side_effect = [contacts, tombstones]
+        result = await get_changes(user=self.user, since=datetime(2023, 1, 1), db=self.session)
+        self.assertEqual(result, (contacts, tombstones, now - timedelta(seconds=60), False))
+
+    async def test_get_changes_cursor_never_moves_back(self):
+        since = datetime(2023, 1, 1, 23, 59, 30)
+        self.session.scalar.return_value = datetime(2023, 1, 2)
+        self.session.scalars().all.side_effect = [[], []]
+        _, _, cursor, _ = await get_changes(user=self.user, since=since, db=self.session)
+        self.assertEqual(cursor, since)
+
+    async def test_get_changes_full_sync(self):
+        contacts = [Contact(id=1), Contact(id=2)]
+        self.session.scalar.return_value = datetime(2023, 1, 2)
+        self.session.scalars().all.return_value = contacts
+        result = await get_changes(user=self.user, since=None, db=self.session)
+        self.assertEqual(result, (contacts, [], datetime(2023, 1, 1, 23, 59), True))
+
+    async def test_get_changes_expired_cursor_gets_full_sync(self):
+        contacts = [Contact(id=1)]
+        self.session.scalar.return_value = datetime(2023, 3, 1)
+        self.session.scalars().all.return_value = contacts
+        changed, tombstones, _, full_sync = await get_changes(user=self.user, since=datetime(2023, 1, 1),
+                                                              db=self.session)
+        self.assertEqual((changed, tombstones, full_sync), (contacts, [], True))
+
+    async def test_prune_tombstones(self):
+        self.session.execute.return_value.rowcount = 3
+        result = await prune_tombstones(db=self.session)
+        self.assertEqual(result, 3)
+        self.session.commit.assert_called_once()
 
     async def test_remove_contact_found(self):
-        contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1)
+        self.session.scalars().first.return_value = contact
         result = await remove_contact(user=self.user, contact_id=1, db=self.session)
         self.assertEqual(result, contact)
+        tombstone = self.session.add.call_args.args[0]
+        self.assertIsInstance(tombstone, ContactTombstone)
+        self.assertEqual(tombstone.contact_id, 1)
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.scalars().first.return_value = None
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
     async def test_upcoming_birthdays(self):
 
         today = datetime.now().date()
-        self.session.query().filter().all.return_value = [
+        self.session.scalars().all.return_value = [
             Contact(date_of_birth=today + timedelta(days=i), user=self.user) for i in range(1, 8)
         ]
 
@@ -78,6 +153,52 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         for contact in result:
             self.assertTrue(today <= contact.date_of_birth <= today + timedelta(days=7))
 
+    async def test_upcoming_birthdays_by_user(self):
+        other = User(id=2)
+        rows = [
+            SimpleNamespace(id=1, username="a", email="a@example.com", Contact=Contact(id=1)),
+            SimpleNamespace(id=1, username="a", email="a@example.com", Contact=Contact(id=2)),
+            SimpleNamespace(id=other.id, username="b", email="b@example.com", Contact=None),
+        ]
+        self.session.query().outerjoin().order_by().yield_per.return_value = rows
+
+        result = [(user.id, [contact.id for contact in contacts])
+                  async for user, contacts in upcoming_birthdays_by_user(datetime.now().date(), self.session)]
+
+        self.assertEqual(result, [(1, [1, 2]), (2, [])])
+
+    async def test_lookup_contacts(self):
+        contacts = [Contact(phone_number="0932044873")]
+        self.session.query().filter().filter().all.return_value = contacts
+        result = await lookup_contacts(user=self.user, db=self.session, phone="+38 093 204 48 73")
+        self.assertEqual(result, contacts)
+        self.assertEqual(contacts[0].phone_e164, "+380932044873")
+
+    async def test_lookup_contacts_invalid_value(self):
+        self.assertEqual(await lookup_contacts(user=self.user, db=self.session, phone="call me"), [])
+        self.assertEqual(await lookup_contacts(user=self.user, db=self.session, email="  "), [])
+        self.session.query().filter().all.assert_not_called()
+
+    async def test_suggest_contacts(self):
+        anna = Contact(id=1, name="Anna", surname="Zed")
+        bob = Contact(id=2, name="Bob", surname="Anders")
+        both = Contact(id=3, name="Ann", surname="Anderson")
+        self.session.query().filter().options().order_by().limit().all.side_effect = [[both, anna], [bob, both]]
+
+        result = await suggest_contacts(user=self.user, prefix="An", limit=2, db=self.session)
+
+        self.assertEqual(result, [bob, both])
+
+    async def test_find_duplicates(self):
+        a = Contact(id=1, phone_number="0932044873", email="a@example.com")
+        b = Contact(id=2, phone_number="+380932044873", email="b@example.com")
+        c = Contact(id=3, phone_number="0501112233", email="B@example.com")
+        self.session.query().join().filter().order_by().all.side_effect = [[a, b], [b, c]]
+
+        result = await find_duplicates(user=self.user, db=self.session)
+
+        self.assertEqual(result, [(["email_normalized", "phone_e164"], [a, b, c])])
+
     async def test_read_contacts(self):
         self.session.query().filter().all.return_value = [
             Contact(name="John", surname="Doe", email="john@example.com", user=self.user),
@@ -95,7 +216,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             date_of_birth=datetime(1990, 1, 1), description="Old description",
             email="old@example.com", user=self.user
         )
-        self.session.query().filter().first.return_value = existing_contact
+        self.session.scalars().first.return_value = existing_contact
 
         updated_contact_model = ContactModel(
             name="NewName", surname="NewSurname", phone_number="987654321",
@@ -108,11 +229,11 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             body=updated_contact_model, contact_id=1, user=self.user, db=self.session
         )
 
-        self.assertEqual(result.name, ("NewName",))
-        self.assertEqual(result.surname, ("NewSurname",))
-        self.assertEqual(result.phone_number, ("987654321",))
-        self.assertEqual(result.date_of_birth, (date(1995, 5, 5),))
-        self.assertEqual(result.description, ("New description",))
+        self.assertEqual(result.name, "NewName")
+        self.assertEqual(result.surname, "NewSurname")
+        self.assertEqual(result.phone_number, "987654321")
+        self.assertEqual(result.date_of_birth, date(1995, 5, 5))
+        self.assertEqual(result.description, "New description")
         self.assertEqual(result.email, "new@example.com")
 
 
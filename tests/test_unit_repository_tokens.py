@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from fakeredis.aioredis import FakeRedis
+
+from src.repository.tokens import (
+    create_session,
+    consume_session,
+    is_session_active,
+    revoke_session,
+    revoke_all_sessions,
+)
+
+
+class TestTokens(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.r = MagicMock()
+        self.r.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.r.delete = AsyncMock()
+        self.r.incr = AsyncMock()
+        self.email = "s.nester@gmail.com"
+
+    async def test_create_session(self):
+        self.pipe.execute.return_value = ["2", True]
+        result = await create_session(self.email, self.r)
+        self.assertEqual(result["gen"], 2)
+        self.assertTrue(result["jti"])
+        key = self.pipe.set.call_args.args[0]
+        self.assertEqual(key, f"refresh_token:{self.email}:{result['jti']}")
+
+    async def test_is_session_active(self):
+        self.pipe.execute.return_value = ["1", 1]
+        result = await is_session_active({"sub": self.email, "jti": "abc", "gen": 1}, self.r)
+        self.assertTrue(result)
+
+    async def test_is_session_active_revoked(self):
+        self.pipe.execute.return_value = [None, 0]
+        result = await is_session_active({"sub": self.email, "jti": "abc", "gen": 0}, self.r)
+        self.assertFalse(result)
+
+    async def test_is_session_active_old_generation(self):
+        self.pipe.execute.return_value = ["3", 1]
+        result = await is_session_active({"sub": self.email, "jti": "abc", "gen": 2}, self.r)
+        self.assertFalse(result)
+
+    async def test_revoke_session(self):
+        await revoke_session({"sub": self.email, "jti": "abc"}, self.r)
+        self.r.delete.assert_awaited_once_with(f"refresh_token:{self.email}:abc")
+
+    async def test_revoke_session_without_jti(self):
+        await revoke_session({"sub": self.email}, self.r)
+        self.r.delete.assert_not_awaited()
+
+    async def test_revoke_all_sessions(self):
+        await revoke_all_sessions(self.email, self.r)
+        self.r.incr.assert_awaited_once_with(f"refresh_token_gen:{self.email}")
+
+
+class TestConsumeSession(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.r = FakeRedis(decode_responses=True)
+        self.email = "s.nester@gmail.com"
+        self.payload = {"sub": self.email, **await create_session(self.email, self.r)}
+
+    async def asyncTearDown(self):
+        await self.r.close()
+
+    async def test_concurrent_refreshes_consume_once(self):
+        results = await asyncio.gather(*(consume_session(self.payload, self.r) for _ in range(5)))
+        self.assertEqual(results.count(True), 1)
+        # the losers raced within the grace window: no reuse, other sessions stay valid
+        self.assertIsNone(await self.r.get(f"refresh_token_gen:{self.email}"))
+
+    async def test_reuse_after_grace_revokes_all(self):
+        other = {"sub": self.email, **await create_session(self.email, self.r)}
+        self.assertTrue(await consume_session(self.payload, self.r))
+        await self.r.delete(f"refresh_token_rotated:{self.email}:{self.payload['jti']}")
+        self.assertFalse(await consume_session(self.payload, self.r))
+        self.assertFalse(await is_session_active(other, self.r))
+
+    async def test_token_without_jti(self):
+        self.assertFalse(await consume_session({"sub": self.email}, self.r))
+        self.assertIsNone(await self.r.get(f"refresh_token_gen:{self.email}"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import MagicMock
+
+from sqlalchemy.orm import Session
+
+from src.database.models import User
+from src.schema import UserModel
+from src.repository.users import (
+    create_user,
+    confirmed_email,
+    get_user_by_email,
+    USER_BY_EMAIL,
+)
+
+
+class TestUsers(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.body = UserModel(username="serhii", email="s.nester@gmail.com", password="secret")
+
+    async def test_get_user_by_email(self):
+        user = User(email=self.body.email)
+        self.session.scalars().first.return_value = user
+        result = await get_user_by_email(self.body.email, self.session)
+        self.assertEqual(result, user)
+        self.session.scalars.assert_called_with(USER_BY_EMAIL, {"email": self.body.email})
+
+    async def test_create_user(self):
+        user = User(id=1, username=self.body.username, email=self.body.email)
+        self.session.execute().scalar_one_or_none.return_value = user
+        result = await create_user(body=self.body, db=self.session)
+        self.assertEqual(result, user)
+        self.session.commit.assert_called_once()
+
+    async def test_create_user_already_exists(self):
+        self.session.execute().scalar_one_or_none.return_value = None
+        result = await create_user(body=self.body, db=self.session)
+        self.assertIsNone(result)
+
+    async def test_confirmed_email(self):
+        self.session.execute().scalar_one_or_none.return_value = 1
+        result = await confirmed_email(email=self.body.email, db=self.session)
+        self.assertTrue(result)
+
+    async def test_confirmed_email_already_confirmed(self):
+        self.session.execute().scalar_one_or_none.return_value = None
+        result = await confirmed_email(email=self.body.email, db=self.session)
+        self.assertFalse(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
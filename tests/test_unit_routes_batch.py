@@ -0,0 +1,111 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.routes.batch import batch, run_operation
+from src.schema import BatchModel, BatchOperation
+
+CONTACT = {"name": "Ann", "surname": "Lee", "email": "ann@example.com", "phone_number": "0931234567",
+           "date_of_birth": "1990-01-01", "description": "friend"}
+
+
+def sqlite_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    # let SQLAlchemy, not pysqlite, start transactions, so that SAVEPOINTs work
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    return engine
+
+
+class TestBatch(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = sqlite_engine()
+        self.db = sessionmaker(bind=self.engine, expire_on_commit=False)()
+        self.user = User(email="s.nester@gmail.com", password="secret")
+        self.db.add(self.user)
+        self.db.commit()
+        self.publish = self.patch("src.repository.contacts.publish_contact_event")
+        self.invalidate = self.patch("src.repository.contacts.contacts_cache.invalidate")
+        self.patch("src.repository.contacts.birthday_digest.invalidate")
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def patch(self, target):
+        patcher = patch(target, new_callable=AsyncMock)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def count(self):
+        return self.db.scalar(select(func.count()).select_from(Contact))
+
+    async def run_batch(self, *operations, atomic=False):
+        body = BatchModel(operations=[BatchOperation(**operation) for operation in operations], atomic=atomic)
+        return await batch(body, self.user, self.db)
+
+    async def test_atomic_failure_rolls_back_without_side_effects(self):
+        response = await self.run_batch({"method": "POST", "path": "/contacts/", "body": CONTACT},
+                                        {"method": "DELETE", "path": "/contacts/999"},
+                                        {"method": "POST", "path": "/contacts/", "body": CONTACT}, atomic=True)
+        self.assertFalse(response["committed"])
+        self.assertEqual([result["status"] for result in response["results"]], [201, 404])
+        self.assertEqual(self.count(), 0)
+        self.publish.assert_not_awaited()
+        self.invalidate.assert_not_awaited()
+
+    async def test_atomic_success_publishes_after_commit(self):
+        response = await self.run_batch({"method": "POST", "path": "/contacts/", "body": CONTACT},
+                                        {"method": "POST", "path": "/api/contacts", "body": CONTACT}, atomic=True)
+        self.assertTrue(response["committed"])
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.publish.await_count, 2)
+        self.invalidate.assert_awaited_once_with(self.user.id)
+
+    async def test_non_atomic_keeps_successful_operations(self):
+        response = await self.run_batch({"method": "POST", "path": "/contacts/", "body": CONTACT},
+                                        {"method": "GET", "path": "/contacts/999"},
+                                        {"method": "POST", "path": "/contacts/", "body": {"name": "Bob"}})
+        self.assertTrue(response["committed"])
+        self.assertEqual([result["status"] for result in response["results"]], [201, 404, 422])
+        self.assertEqual(self.count(), 1)
+        self.publish.assert_awaited_once()
+
+    async def test_database_error_is_reported_per_operation(self):
+        with patch("src.repository.contacts.get_contacts", side_effect=OperationalError("SELECT", {}, None)):
+            response = await self.run_batch({"method": "GET", "path": "/contacts/"},
+                                            {"method": "POST", "path": "/contacts/", "body": CONTACT})
+        self.assertEqual([result["status"] for result in response["results"]], [500, 201])
+
+    async def test_operation_limit(self):
+        with patch("src.routes.batch.settings.batch_max_operations", 2):
+            with self.assertRaises(HTTPException) as raised:
+                await self.run_batch(*[{"method": "GET", "path": "/contacts/"}] * 3)
+        self.assertEqual(raised.exception.status_code, 400)
+
+    async def test_run_operation_routes_paths(self):
+        cases = [({"method": "GET", "path": "/users/me"}, 404),
+                 ({"method": "DELETE", "path": "/contacts/"}, 405),
+                 ({"method": "GET", "path": "/contacts/"}, 200)]
+        for operation, expected in cases:
+            code, _ = await run_operation(BatchOperation(**operation), self.user, self.db)
+            self.assertEqual(code, expected, operation)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import unittest
+
+from src.services.admission import AdmissionControl, AdmissionMiddleware
+from src.services.loop_monitor import LoopMonitor
+
+
+class TestAdmissionControl(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.occupancy = 0.0
+        self.lag = 0.0
+        self.control = AdmissionControl(max_in_flight=10, max_loop_lag=0.1, shed_low_at=0.7,
+                                        pool_occupancy=lambda: self.occupancy, loop_lag=lambda: self.lag,
+                                        critical=("/api/auth",), low=("/api/contacts/find",),
+                                        exempt=("/api/contacts/stream",))
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def test_priority(self):
+        self.assertEqual(self.control.priority("/api/auth/login"), "critical")
+        self.assertEqual(self.control.priority("/api/contacts/find"), "low")
+        self.assertEqual(self.control.priority("/api/contacts/stream"), "exempt")
+        self.assertEqual(self.control.priority("/api/contacts/1"), "normal")
+
+    def test_low_priority_shed_first(self):
+        self.occupancy = 0.8
+        self.assertFalse(self.control.admit("low"))
+        self.assertTrue(self.control.admit("normal"))
+        self.assertTrue(self.control.admit("critical"))
+
+    def test_saturated_sheds_all_but_critical(self):
+        self.lag = 0.2
+        self.assertFalse(self.control.admit("normal"))
+        self.assertTrue(self.control.admit("critical"))
+
+    async def test_middleware_sheds_with_retry_after(self):
+        self.control.in_flight = 10
+        middleware = AdmissionMiddleware(None, self.control, retry_after=3)
+        await middleware({"type": "http", "path": "/api/contacts/1", "headers": []}, None, self.send)
+        self.assertEqual(self.sent[0]["status"], 503)
+        self.assertIn((b"retry-after", b"3"), self.sent[0]["headers"])
+
+    async def test_middleware_counts_in_flight(self):
+        seen = []
+
+        async def app(scope, receive, send):
+            seen.append(self.control.in_flight)
+
+        middleware = AdmissionMiddleware(app, self.control)
+        await middleware({"type": "http", "path": "/api/contacts/1", "headers": []}, None, self.send)
+        await middleware({"type": "http", "path": "/api/contacts/stream", "headers": []}, None, self.send)
+        self.assertEqual(seen, [1, 0])
+        self.assertEqual(self.control.in_flight, 0)
+
+
+class TestLoopMonitor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_blocked_loop_shows_lag(self):
+        monitor = LoopMonitor(0.01)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        await monitor.close()
+        self.assertGreater(monitor.lag, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from src.services.blocking import BlockingDetector, BlockingMiddleware
+
+
+def block(seconds):
+    time.sleep(seconds)
+
+
+class TestBlockingDetector(unittest.IsolatedAsyncioTestCase):
+
+    async def test_records_route_and_stack_of_blocking_call(self):
+        detector = BlockingDetector(threshold=0.05, interval=0.005)
+        detector.start()
+
+        async def app(scope, receive, send):
+            await asyncio.sleep(0.02)
+            block(0.2)
+            await asyncio.sleep(0.02)
+
+        middleware = BlockingMiddleware(app, detector)
+        await middleware({"type": "http", "method": "GET", "path": "/api/contacts/1",
+                          "route": MagicMock(path="/api/contacts/{contact_id}")}, None, None)
+        await detector.close()
+
+        report = detector.report()
+        episode = report["episodes"][0]
+        self.assertEqual(episode["route"], "GET /api/contacts/{contact_id}")
+        self.assertGreater(episode["duration"], 0.1)
+        self.assertIn("block", episode["stack"][-2])
+        self.assertEqual(report["routes"]["GET /api/contacts/{contact_id}"]["count"], 1)
+        self.assertEqual(detector.scopes, {})
+
+    async def test_short_stalls_are_ignored(self):
+        detector = BlockingDetector(threshold=0.1, interval=0.005)
+        detector.start()
+        await asyncio.sleep(0.02)
+        block(0.02)
+        await asyncio.sleep(0.02)
+        await detector.close()
+        self.assertEqual(detector.report()["episodes"], [])
+        self.assertFalse(detector.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
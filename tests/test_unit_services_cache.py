@@ -0,0 +1,139 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from redis.exceptions import ConnectionError, TimeoutError
+
+from src.services.cache import INVALIDATION_CHANNEL, ContactCache
+
+
+class TestContactCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.r = MagicMock()
+        self.r.pipeline.side_effect = ConnectionError("down")
+        self.r.pubsub.side_effect = ConnectionError("down")
+        self.cache = ContactCache(self.r, self.r, max_entries=2, local_ttl=60, ttl=300, lock_ttl=1)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+
+    async def test_local_hit(self):
+        self.cache._store_local(1, "contact:1", {"id": 1})
+        loader = MagicMock()
+        result = await self.cache.get_or_load(1, "contact:1", loader)
+        self.assertEqual(result, {"id": 1})
+        loader.assert_not_called()
+
+    async def test_lru_eviction(self):
+        self.cache._store_local(1, "a", 1)
+        self.cache._store_local(1, "b", 2)
+        self.cache._store_local(2, "c", 3)
+        self.assertNotIn((1, "a"), self.cache._local)
+        self.assertEqual(self.cache._user_keys[1], {"b"})
+
+    async def test_drop_local(self):
+        self.cache._store_local(1, "a", 1)
+        self.cache._store_local(2, "b", 2)
+        self.cache.drop_local(1)
+        self.assertEqual(list(self.cache._local), [(2, "b")])
+
+    async def test_concurrent_misses_are_coalesced(self):
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"id": 1}
+
+        results = await asyncio.gather(*[self.cache.get_or_load(1, "contact:1", loader) for _ in range(5)])
+        self.assertEqual(results, [{"id": 1}] * 5)
+        self.assertEqual(calls, 1)
+
+
+class TestContactCacheRedis(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        server = FakeServer()
+        self.r = FakeRedis(server=server, decode_responses=True)
+        # the command client times out reads, as redis_client does with REDIS_TIMEOUT; only pubsub_client may wait
+        self.r.pubsub = MagicMock(side_effect=TimeoutError("Timeout reading from socket"))
+        self.subscriber = FakeRedis(server=server, decode_responses=True)
+        # two workers sharing one Redis
+        self.cache = ContactCache(self.r, self.subscriber, max_entries=100, local_ttl=60, ttl=300, lock_ttl=1)
+        self.other = ContactCache(self.r, self.subscriber, max_entries=100, local_ttl=60, ttl=300, lock_ttl=1)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+        await self.other.close()
+        await self.r.close()
+        await self.subscriber.close()
+
+    async def test_fill_is_shared_across_workers(self):
+        await self.cache.get_or_load(1, "contacts", AsyncMock(return_value=[{"id": 1}]))
+        self.assertEqual(json.loads(await self.r.hget("cache:contacts:1", "contacts")), [{"id": 1}])
+        self.assertGreater(await self.r.ttl("cache:contacts:1"), 0)
+        loader = AsyncMock()
+        self.assertEqual(await self.other.get_or_load(1, "contacts", loader), [{"id": 1}])
+        loader.assert_not_awaited()
+
+    async def test_invalidate_bumps_generation_and_drops_entries(self):
+        await self.cache.get_or_load(1, "contacts", AsyncMock(return_value=[{"id": 1}]))
+        await self.cache.invalidate(1)
+        self.assertFalse(await self.r.exists("cache:contacts:1"))
+        self.assertEqual(await self.r.get("cache:contacts:1:gen"), "1")
+        self.assertNotIn((1, "contacts"), self.cache._local)
+
+    async def test_invalidation_reaches_other_workers(self):
+        await self.other.get_or_load(1, "contacts", AsyncMock(return_value=[{"id": 1}]))
+        for _ in range(100):
+            if await self.r.pubsub_numsub(INVALIDATION_CHANNEL) == [(INVALIDATION_CHANNEL, 1)]:
+                break
+            await asyncio.sleep(0.01)
+        await self.cache.invalidate(1)
+        for _ in range(100):
+            if (1, "contacts") not in self.other._local:
+                break
+            await asyncio.sleep(0.01)
+        self.assertNotIn((1, "contacts"), self.other._local)
+
+    async def test_idle_listener_keeps_local_entries(self):
+        await self.other.get_or_load(1, "contacts", AsyncMock(return_value=[{"id": 1}]))
+        with self.assertNoLogs("src.services.cache", "WARNING"):
+            await asyncio.sleep(0.2)
+        self.assertIn((1, "contacts"), self.other._local)
+        self.assertEqual(await self.subscriber.pubsub_numsub(INVALIDATION_CHANNEL), [(INVALIDATION_CHANNEL, 1)])
+
+    async def test_fill_loaded_before_invalidation_is_discarded(self):
+        async def loader():
+            await self.other.invalidate(1)
+            return [{"id": 1, "name": "old"}]
+
+        self.assertEqual(await self.cache.get_or_load(1, "contacts", loader), [{"id": 1, "name": "old"}])
+        self.assertIsNone(await self.r.hget("cache:contacts:1", "contacts"))
+        self.assertNotIn((1, "contacts"), self.cache._local)
+
+    async def test_waits_for_fill_of_other_worker(self):
+        filling = asyncio.Event()
+
+        async def slow_loader():
+            filling.set()
+            await asyncio.sleep(0.1)
+            return [{"id": 1}]
+
+        first = asyncio.create_task(self.cache.get_or_load(1, "contacts", slow_loader))
+        await filling.wait()
+        self.assertTrue(await self.r.exists("cache:contacts:1:lock:contacts"))
+        loader = AsyncMock()
+        self.assertEqual(await self.other.get_or_load(1, "contacts", loader), [{"id": 1}])
+        loader.assert_not_awaited()
+        await first
+        self.assertFalse(await self.r.exists("cache:contacts:1:lock:contacts"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sqlalchemy.exc import OperationalError
+
+from src.services.deadline import (
+    DeadlineMiddleware,
+    operational_error_handler,
+    parse_timeouts,
+    remaining,
+    set_statement_timeout,
+)
+
+
+def scope(path="/api/contacts/", headers=()):
+    return {"type": "http", "path": path, "headers": list(headers)}
+
+
+class TestDeadlineMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.remaining = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def receive(self):
+        return {"type": "http.disconnect"}
+
+    def app(self, delay, after=0):
+        async def app(scope, receive, send):
+            self.remaining.append(remaining())
+            await asyncio.sleep(delay)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+            # work after the response, like a background task
+            await asyncio.sleep(after)
+            self.remaining.append(remaining())
+        return app
+
+    async def call(self, app, request_scope, default=0.05, routes=None):
+        middleware = DeadlineMiddleware(app, default=default, routes=routes)
+        await middleware(request_scope, self.receive, self.send)
+
+    async def test_fast_request_passes(self):
+        await self.call(self.app(0), scope())
+        self.assertEqual(self.sent[0]["status"], 200)
+        self.assertTrue(0 < self.remaining[0] <= 0.05)
+
+    async def test_slow_request_gets_504(self):
+        await self.call(self.app(1), scope())
+        self.assertEqual(self.sent[0]["status"], 504)
+        self.assertEqual(json.loads(self.sent[1]["body"]), {"detail": "Request timed out"})
+
+    async def test_route_without_deadline(self):
+        await self.call(self.app(0.1), scope("/api/contacts/stream"), routes={"/api/contacts/stream": 0})
+        self.assertEqual(self.sent[0]["status"], 200)
+        self.assertIsNone(self.remaining[0])
+
+    async def test_header_only_shortens(self):
+        await self.call(self.app(0.1), scope(headers=[(b"x-request-timeout", b"0.01")]), default=1)
+        self.assertEqual(self.sent[0]["status"], 504)
+        self.sent.clear()
+        await self.call(self.app(0.1), scope(headers=[(b"x-request-timeout", b"60")]), default=0.05)
+        self.assertEqual(self.sent[0]["status"], 504)
+
+    async def test_deadline_lifted_after_response(self):
+        await self.call(self.app(0, after=0.1), scope())
+        self.assertEqual([message["type"] for message in self.sent], ["http.response.start", "http.response.body"])
+        self.assertIsNone(self.remaining[1])
+
+    def test_parse_timeouts(self):
+        self.assertEqual(parse_timeouts("/api/contacts/find=3, /api/contacts/stream=0,"),
+                         {"/api/contacts/find": 3.0, "/api/contacts/stream": 0.0})
+
+
+class TestStatementTimeout(unittest.IsolatedAsyncioTestCase):
+
+    async def test_sets_local_timeout_within_deadline(self):
+        conn = MagicMock()
+        conn.dialect.name = "postgresql"
+
+        async def app(scope, receive, send):
+            set_statement_timeout(conn)
+
+        await DeadlineMiddleware(app, default=2)(scope(), None, None)
+        statement = conn.exec_driver_sql.call_args.args[0]
+        self.assertTrue(statement.startswith("SET LOCAL statement_timeout = "))
+        self.assertTrue(0 < int(statement.rsplit(" ", 1)[1]) <= 2000)
+
+    async def test_no_deadline_no_timeout(self):
+        conn = MagicMock()
+        conn.dialect.name = "postgresql"
+        set_statement_timeout(conn)
+        conn.exec_driver_sql.assert_not_called()
+
+    async def test_query_canceled_is_504(self):
+        response = await operational_error_handler(None, OperationalError("SELECT", {}, SimpleNamespace(pgcode="57014")))
+        self.assertEqual(response.status_code, 504)
+
+    async def test_connection_error_is_503(self):
+        response = await operational_error_handler(None, OperationalError("SELECT", {}, SimpleNamespace(pgcode=None)))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fakeredis.aioredis import FakeRedis
+
+from src.routes.contacts import event_stream
+from src.services.events import ContactEventHub
+
+
+class TestContactEventHub(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.r = FakeRedis(decode_responses=True)
+        self.hub = ContactEventHub(self.r, queue_size=2)
+
+    async def asyncTearDown(self):
+        await self.hub.close()
+        await self.r.close()
+
+    async def wait_for_listener(self):
+        for _ in range(100):
+            if await self.r.pubsub_numpat():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("listener did not subscribe")
+
+    async def test_subscribe_and_unsubscribe(self):
+        first, second = self.hub.subscribe(1), self.hub.subscribe(1)
+        self.assertEqual(self.hub.subscribers, 2)
+        self.hub.unsubscribe(first)
+        self.hub.unsubscribe(first)
+        self.assertEqual(self.hub.subscribers, 1)
+        self.hub.unsubscribe(second)
+        self.assertEqual(self.hub.subscribers, 0)
+
+    async def test_dispatch_reaches_only_the_user(self):
+        mine, other = self.hub.subscribe(1), self.hub.subscribe(2)
+        self.hub.dispatch(1, "event")
+        self.assertEqual(mine.queue.get_nowait(), "event")
+        self.assertTrue(other.queue.empty())
+        self.assertEqual(self.hub.delivered, 1)
+
+    async def test_overflow_drops_slow_subscription(self):
+        slow = self.hub.subscribe(1)
+        for event in ("a", "b", "c"):
+            self.hub.dispatch(1, event)
+        self.assertIsNone(slow.queue.get_nowait())
+        self.assertTrue(slow.queue.empty())
+        self.assertEqual(self.hub.dropped, 1)
+        self.assertEqual(self.hub.subscribers, 0)
+
+    async def test_listener_dispatches_and_skips_malformed_channels(self):
+        subscription = self.hub.subscribe(7)
+        await self.wait_for_listener()
+        await self.r.publish("contacts:not-a-user", "ignored")
+        await self.r.publish("contacts:7", "event")
+        self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 1), "event")
+        self.assertFalse(self.hub._task.done())
+
+
+class TestEventStream(unittest.IsolatedAsyncioTestCase):
+
+    async def test_heartbeat_until_disconnect(self):
+        hub = ContactEventHub(MagicMock(), queue_size=2)
+        with patch.object(hub, "_listen", AsyncMock()):
+            subscription = hub.subscribe(1)
+        request = MagicMock(is_disconnected=AsyncMock(side_effect=[False, True]))
+        with patch("src.routes.contacts.settings.sse_heartbeat", 0.01), \
+                patch("src.routes.contacts.contact_events", hub):
+            frames = [frame async for frame in event_stream(request, subscription)]
+        self.assertEqual(frames, ["retry: 10.0\n\n", ": keep-alive\n\n"])
+        self.assertEqual(hub.subscribers, 0)
+
+    async def test_overflow_event_ends_stream(self):
+        hub = ContactEventHub(MagicMock(), queue_size=1)
+        with patch.object(hub, "_listen", AsyncMock()):
+            subscription = hub.subscribe(1)
+        hub.dispatch(1, "a")
+        hub.dispatch(1, "b")
+        with patch("src.routes.contacts.contact_events", hub):
+            frames = [frame async for frame in event_stream(MagicMock(), subscription)]
+        self.assertEqual(frames[-1], "event: overflow\ndata: {}\n\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import HTTPException
+
+from src.services.idempotency import IdempotencyStore
+
+
+class TestIdempotencyStore(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.data = {}
+
+        async def set_(key, value, nx=False, px=None, ex=None):
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+        async def delete(key):
+            self.data.pop(key, None)
+
+        self.r = MagicMock()
+        self.r.set = AsyncMock(side_effect=set_)
+        self.r.get = AsyncMock(side_effect=lambda key: self.data.get(key))
+        self.r.delete = AsyncMock(side_effect=delete)
+        self.store = IdempotencyStore(self.r, ttl=60, lock_ttl=5, wait=1)
+        self.calls = 0
+
+    async def handler(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return 201, '{"id": %d}' % self.calls
+
+    async def test_replay_returns_stored_response(self):
+        first = await self.store.execute("1", "key", "a", self.handler)
+        second = await self.store.execute("1", "key", "a", self.handler)
+        self.assertEqual(first, (201, '{"id": 1}', False))
+        self.assertEqual(second, (201, '{"id": 1}', True))
+        self.assertEqual(self.calls, 1)
+
+    async def test_concurrent_duplicates_wait_for_first(self):
+        results = await asyncio.gather(*[self.store.execute("1", "key", "a", self.handler) for _ in range(3)])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([replayed for _, _, replayed in results], [False, True, True])
+
+    async def test_different_body_is_rejected(self):
+        await self.store.execute("1", "key", "a", self.handler)
+        with self.assertRaises(HTTPException) as err:
+            await self.store.execute("1", "key", "b", self.handler)
+        self.assertEqual(err.exception.status_code, 422)
+
+    async def test_failure_releases_key(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            await self.store.execute("1", "key", "a", fail)
+        self.assertEqual(self.data, {})
+        self.assertFalse((await self.store.execute("1", "key", "a", self.handler))[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
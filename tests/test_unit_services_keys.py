@@ -0,0 +1,82 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from jose import JWTError
+
+from src.services.keys import KeyRing
+
+
+class TestKeyRing(unittest.TestCase):
+
+    def setUp(self):
+        self.keys_dir = tempfile.mkdtemp()
+        self.key_ring = KeyRing("RS256", "secret", self.keys_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.keys_dir)
+
+    def test_generates_key_and_round_trips(self):
+        token = self.key_ring.encode({"sub": "s.nester@gmail.com"})
+        self.assertEqual(len(list(Path(self.keys_dir).glob("*.pem"))), 1)
+        self.assertEqual(self.key_ring.decode(token)["sub"], "s.nester@gmail.com")
+
+    def test_workers_starting_together_share_one_key(self):
+        workers = [KeyRing("RS256", "secret", self.keys_dir) for _ in range(4)]
+        with ThreadPoolExecutor(len(workers)) as pool:
+            tokens = list(pool.map(lambda key_ring: key_ring.encode({"sub": "s.nester@gmail.com"}), workers))
+        self.assertEqual(len(list(Path(self.keys_dir).glob("*.pem"))), 1)
+        for key_ring in workers:
+            for token in tokens:
+                self.assertEqual(key_ring.decode(token)["sub"], "s.nester@gmail.com")
+
+    @unittest.skipIf(os.name != "posix", "file modes are POSIX only")
+    def test_generated_key_is_private(self):
+        self.key_ring.load()
+        path, = Path(self.keys_dir).glob("*.pem")
+        self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o600)
+
+    def test_generates_key_without_fcntl(self):
+        with patch.dict("sys.modules", {"fcntl": None}):
+            token = self.key_ring.encode({"sub": "s.nester@gmail.com"})
+        self.assertEqual(self.key_ring.decode(token)["sub"], "s.nester@gmail.com")
+
+    def test_jwks_publishes_public_keys(self):
+        jwks = self.key_ring.jwks()
+        self.assertEqual(len(jwks["keys"]), 1)
+        key = jwks["keys"][0]
+        self.assertEqual(key["kty"], "RSA")
+        self.assertIn("kid", key)
+        self.assertNotIn("d", key)
+
+    def test_rotation_keeps_old_tokens_valid(self):
+        old_token = self.key_ring.encode({"sub": "old"})
+        shutil.copy(next(Path(self.keys_dir).glob("*.pem")), Path(self.keys_dir) / "99999999999999.pem")
+        self.key_ring.load()
+        new_token = self.key_ring.encode({"sub": "new"})
+        self.assertEqual(self.key_ring.decode(old_token)["sub"], "old")
+        self.assertEqual(self.key_ring.decode(new_token)["sub"], "new")
+        self.assertEqual(len(self.key_ring.jwks()["keys"]), 2)
+
+    def test_unknown_kid(self):
+        other = KeyRing("RS256", "secret", tempfile.mkdtemp())
+        token = other.encode({"sub": "s.nester@gmail.com"})
+        shutil.rmtree(other.keys_dir)
+        self.key_ring.load()
+        with self.assertRaises(JWTError):
+            self.key_ring.decode(token)
+
+    def test_symmetric(self):
+        key_ring = KeyRing("HS256", "secret", self.keys_dir)
+        token = key_ring.encode({"sub": "s.nester@gmail.com"})
+        self.assertEqual(key_ring.decode(token)["sub"], "s.nester@gmail.com")
+        self.assertEqual(key_ring.jwks(), {"keys": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
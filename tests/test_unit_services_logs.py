@@ -0,0 +1,123 @@
+import io
+import json
+import logging
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from src.services.logs import (
+    AccessLogMiddleware,
+    ContextFilter,
+    LogPipeline,
+    after_cursor_execute,
+    before_cursor_execute,
+    bind,
+    mask_email,
+    request_log,
+)
+
+
+class TestLogPipeline(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.pipeline = LogPipeline("INFO", 1.0, self.stream)
+        self.pipeline.start()
+        self.sent = []
+
+    def tearDown(self):
+        self.pipeline.close()
+
+    def lines(self):
+        self.pipeline.close()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def test_access_record_has_request_fields(self):
+        async def app(scope, receive, send):
+            scope["route"] = MagicMock(path="/api/contacts/{contact_id}")
+            bind(user_id=7)
+            logging.getLogger("test").warning("inside %s", "request")
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        middleware = AccessLogMiddleware(app)
+        await middleware({"type": "http", "method": "GET", "path": "/api/contacts/1",
+                          "headers": [(b"x-request-id", b"abc")]}, None, self.send)
+        inside, access = self.lines()
+        self.assertEqual(inside["message"], "inside request")
+        self.assertEqual(inside["request_id"], "abc")
+        self.assertEqual(inside["route"], "/api/contacts/{contact_id}")
+        self.assertEqual(access["logger"], "access")
+        self.assertEqual(access["status"], 404)
+        self.assertEqual(access["user_id"], 7)
+        self.assertIn("latency", access)
+        self.assertEqual(access["db_time"], 0.0)
+        self.assertIn((b"x-request-id", b"abc"), self.sent[0]["headers"])
+
+    def test_exception_is_rendered(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("test").exception("failed")
+        record, = self.lines()
+        self.assertEqual(record["level"], "ERROR")
+        self.assertIn("ValueError: boom", record["exception"])
+
+
+class TestContextFilter(unittest.TestCase):
+
+    def record(self, level):
+        return logging.LogRecord("test", level, __file__, 1, "message", None, None)
+
+    def test_samples_only_below_warning(self):
+        sampling = ContextFilter(sample_rate=0.1)
+        with patch("src.services.logs.random.random", return_value=0.5):
+            self.assertFalse(sampling.filter(self.record(logging.INFO)))
+            self.assertTrue(sampling.filter(self.record(logging.WARNING)))
+        with patch("src.services.logs.random.random", return_value=0.05):
+            record = self.record(logging.INFO)
+            self.assertTrue(sampling.filter(record))
+            self.assertEqual(record.sample_rate, 0.1)
+
+
+class TestQueryTiming(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.addCleanup(self.engine.dispose)
+        event.listen(self.engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(self.engine, "after_cursor_execute", after_cursor_execute)
+        self.fields = {}
+        token = request_log.set(self.fields)
+        self.addCleanup(request_log.reset, token)
+
+    def test_statement_time_is_added_to_request(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        self.assertGreater(self.fields["db_time"], 0)
+
+    def test_failed_statement_leaves_nothing_behind(self):
+        with self.engine.connect() as conn:
+            with self.assertRaises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            self.assertNotIn("db_time", self.fields)
+            conn.execute(text("SELECT 1"))
+            self.assertEqual(conn.info, {})
+        self.assertGreater(self.fields["db_time"], 0)
+
+
+class TestMaskEmail(unittest.TestCase):
+
+    def test_mask_email(self):
+        self.assertEqual(mask_email("s.nester@gmail.com"), "s***@gmail.com")
+        self.assertEqual(mask_email("not an email"), "***")
+
+
+if __name__ == '__main__':
+    unittest.main()
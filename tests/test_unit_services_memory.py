@@ -0,0 +1,63 @@
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
+
+from src.services.memory import MemoryMiddleware, MemoryTracker
+
+retained = []
+
+
+def allocate():
+    retained.append(bytearray(1024 * 1024))
+
+
+class TestMemoryTracker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tracker = MemoryTracker(max_snapshots=2)
+        self.tracker.start(5)
+
+    def tearDown(self):
+        self.tracker.stop()
+        retained.clear()
+
+    def test_diff_shows_growing_site(self):
+        first = self.tracker.take_snapshot()
+        allocate()
+        second = self.tracker.take_snapshot()
+        diff = self.tracker.diff(first, second)
+        self.assertIn("test_unit_services_memory.py", diff[0]["site"])
+        self.assertGreaterEqual(diff[0]["size_diff"], 1024 * 1024)
+        self.assertIn("test_unit_services_memory.py", self.tracker.top(second)[0]["site"])
+
+    def test_keeps_newest_snapshots(self):
+        ids = [self.tracker.take_snapshot() for _ in range(3)]
+        self.assertIsNone(self.tracker.top(ids[0]))
+        self.assertEqual([snapshot["id"] for snapshot in self.tracker.status()["snapshots"]], ids[1:])
+
+    async def test_middleware_records_route(self):
+        async def app(scope, receive, send):
+            allocate()
+            bytearray(4 * 1024 * 1024)
+
+        middleware = MemoryMiddleware(app, self.tracker)
+        await middleware({"type": "http", "method": "POST", "path": "/api/contacts/",
+                          "route": MagicMock(path="/api/contacts/")}, None, None)
+        stats = self.tracker.report_routes()["POST /api/contacts/"]
+        self.assertGreaterEqual(stats["retained_bytes"], 1024 * 1024)
+        self.assertGreaterEqual(stats["peak_max_bytes"], 5 * 1024 * 1024)
+
+    async def test_middleware_idle_without_tracing(self):
+        self.tracker.stop()
+
+        async def app(scope, receive, send):
+            allocate()
+
+        middleware = MemoryMiddleware(app, self.tracker)
+        await middleware({"type": "http", "method": "GET", "path": "/"}, None, None)
+        self.assertEqual(self.tracker.report_routes(), {})
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from src.services.normalize import normalize_email, normalize_phone
+
+
+class TestNormalize(unittest.TestCase):
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone("+380932044873"), "+380932044873")
+        self.assertEqual(normalize_phone("+38 (093) 204-48-73"), "+380932044873")
+        self.assertEqual(normalize_phone("00380932044873"), "+380932044873")
+        self.assertEqual(normalize_phone("093 204 48 73", country_code="380"), "+380932044873")
+        self.assertEqual(normalize_phone("+1 415 555 2671"), "+14155552671")
+
+    def test_normalize_phone_invalid(self):
+        self.assertIsNone(normalize_phone(None))
+        self.assertIsNone(normalize_phone("12345"))
+        self.assertIsNone(normalize_phone("+1234567890123456"))
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email("  John.Doe@Example.COM "), "john.doe@example.com")
+        self.assertIsNone(normalize_email("  "))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import marshal
+import unittest
+from unittest.mock import patch
+
+from src.services.profiling import ProfileStore, ProfilingMiddleware
+
+
+def slow_part():
+    return sum(range(1000))
+
+
+async def app(scope, receive, send):
+    slow_part()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class TestProfilingMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.store = ProfileStore(max_entries=2)
+        self.middleware = ProfilingMiddleware(app, self.store)
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def scope(self, headers=(), query=b""):
+        return {"type": "http", "method": "GET", "path": "/api/contacts/", "query_string": query,
+                "headers": [(b"authorization", b"Bearer token"), *headers]}
+
+    async def test_profiles_flagged_request_of_admin(self):
+        with patch("src.services.profiling.auth_service.admin_from_token", return_value="admin@example.com"):
+            await self.middleware(self.scope(query=b"limit=5&profile=1"), None, self.send)
+        headers = dict(self.sent[0]["headers"])
+        profile_id = headers[b"x-profile-id"].decode()
+        self.assertEqual(self.store.list()[0]["status"], 200)
+        self.assertIn("slow_part", self.store.text(profile_id))
+        self.assertIsInstance(marshal.loads(self.store.dump(profile_id)), dict)
+
+    async def test_ignores_flag_without_admin_token(self):
+        with patch("src.services.profiling.auth_service.admin_from_token", return_value=None):
+            await self.middleware(self.scope(headers=[(b"x-profile", b"1")]), None, self.send)
+        self.assertNotIn(b"x-profile-id", dict(self.sent[0]["headers"]))
+        self.assertEqual(self.store.list(), [])
+
+    async def test_unflagged_request_does_not_check_token(self):
+        with patch("src.services.profiling.auth_service.admin_from_token") as admin_from_token:
+            await self.middleware(self.scope(query=b"profiles=1"), None, self.send)
+        admin_from_token.assert_not_called()
+        self.assertEqual(self.store.list(), [])
+
+    async def test_store_keeps_newest(self):
+        with patch("src.services.profiling.auth_service.admin_from_token", return_value="admin@example.com"):
+            for _ in range(3):
+                await self.middleware(self.scope(headers=[(b"x-profile", b"1")]), None, self.send)
+        ids = [dict(message["headers"])[b"x-profile-id"].decode() for message in self.sent[::2]]
+        self.assertEqual([entry["id"] for entry in self.store.list()], ids[:0:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
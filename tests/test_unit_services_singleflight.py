@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+from src.services.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight("test")
+        self.calls = 0
+
+    async def load(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.calls
+
+    async def test_concurrent_calls_share_one_execution(self):
+        results = await asyncio.gather(*[self.flight.do((1, "a"), self.load) for _ in range(5)])
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight._calls, {})
+
+    async def test_different_keys_run_separately(self):
+        await asyncio.gather(self.flight.do((1, "a"), self.load), self.flight.do((2, "a"), self.load))
+        self.assertEqual(self.calls, 2)
+
+    async def test_exception_is_shared(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[self.flight.do("key", fail) for _ in range(3)], return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_follower_takes_over_when_leader_is_cancelled(self):
+        leader = asyncio.create_task(self.flight.do("key", self.load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(self.flight.do("key", self.load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await follower, 2)
+        self.assertTrue(leader.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
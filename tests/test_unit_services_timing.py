@@ -0,0 +1,41 @@
+import unittest
+
+from src.services.metrics import metrics
+from src.services.timing import TimingMiddleware
+
+
+class TestTimingMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def test_adds_header_and_passes_body_through(self):
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"a", "more_body": True})
+            await send({"type": "http.response.body", "body": b"b"})
+
+        before = metrics.snapshot()["counters"].get("http_responses_2xx", 0)
+        await TimingMiddleware(app)({"type": "http"}, None, self.send)
+
+        headers = dict(self.sent[0]["headers"])
+        self.assertEqual(headers[b"content-type"], b"text/plain")
+        self.assertGreaterEqual(float(headers[b"x-process-time"]), 0)
+        self.assertEqual([message.get("body") for message in self.sent[1:]], [b"a", b"b"])
+        self.assertEqual(metrics.snapshot()["counters"]["http_responses_2xx"], before + 1)
+
+    async def test_failure_before_response_counts_as_5xx(self):
+        async def app(scope, receive, send):
+            raise RuntimeError("boom")
+
+        before = metrics.snapshot()["counters"].get("http_responses_5xx", 0)
+        with self.assertRaises(RuntimeError):
+            await TimingMiddleware(app)({"type": "http"}, None, self.send)
+        self.assertEqual(metrics.snapshot()["counters"]["http_responses_5xx"], before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()